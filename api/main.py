@@ -3,21 +3,26 @@ Enterprise-grade API layer for AI Orchestrator
 FastAPI with async support, authentication, rate limiting, and comprehensive endpoints
 """
 import asyncio
+import base64
 import json
 import logging
 import os
+import time
 import uuid
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
 import asyncpg
-import redis
+import orjson
+import redis.asyncio as redis
 from dotenv import load_dotenv
-from fastapi import (BackgroundTasks, Depends, FastAPI, HTTPException,
-                     Security)
+from arq import create_pool
+from arq.connections import RedisSettings
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Security
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel, Field
 
@@ -34,9 +39,44 @@ security = HTTPBearer()
 DATABASE_URL = os.getenv("DATABASE_URL")
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
+# Connection pool tuning
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "50"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "1024"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+# Seconds a request waits for a free Redis connection once the pool is at its cap
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+
+# Serialization: datetimes without a tzinfo are stored as UTC
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_UUID
+
+# Organization rows change rarely; serve them from Redis for a short while
+ORGANIZATION_CACHE_TTL_SECONDS = 60
+
+# Rate limiting
+RATE_LIMIT_REQUESTS = 1000  # requests per window
+RATE_LIMIT_WINDOW_SECONDS = 3600  # 1 hour window
+
+# Sliding-log limiter: trim entries older than the window, count with ZCARD
+# and record the request, all atomically in one round-trip
+RATE_LIMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], window)
+return 1
+"""
+
 # Global connections
 db_pool = None
 redis_client = None
+rate_limit_script = None
+job_queue = None
 
 
 @asynccontextmanager
@@ -46,16 +86,35 @@ async def lifespan(_: FastAPI):
     To be used with the lifespan argument of the FastAPI constructor.
     """
     # Startup
-    global db_pool, redis_client
-    db_pool = await asyncpg.create_pool(DATABASE_URL)
-    redis_client = redis.from_url(REDIS_URL)
+    global db_pool, redis_client, rate_limit_script, job_queue
+    db_pool = await asyncpg.create_pool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_queries=50000,
+        max_inactive_connection_lifetime=300,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE
+    )
+    # A blocking pool queues bursts beyond the cap instead of failing them
+    # with "Too many connections"; the client owns and closes the pool
+    redis_client = redis.Redis.from_pool(redis.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        decode_responses=True,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL
+    ))
+    await redis_client.ping()
+    rate_limit_script = redis_client.register_script(RATE_LIMIT_SCRIPT)
+    job_queue = await create_pool(RedisSettings.from_dsn(REDIS_URL))
     logger.info("Database and Redis connections established")
 
     yield
 
     # Shutdown
     await db_pool.close()
-    redis_client.close()
+    await redis_client.aclose()
+    await job_queue.aclose()
     logger.info("Connections closed")
 
 
@@ -63,7 +122,8 @@ APP = FastAPI(
     title="AI Orchestrator API",
     description="Enterprise-grade API for AI-powered project orchestration",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Middleware
@@ -82,6 +142,9 @@ APP.add_middleware(
 
 # Pydantic Models
 
+# Compiled once by pydantic-core (Rust regex) when the model class is built
+EMAIL_PATTERN = r'^[^@]+@[^@]+\.[^@]+$'
+
 
 class OrganizationCreate(BaseModel):
     """Organization creation model."""
@@ -92,7 +155,7 @@ class OrganizationCreate(BaseModel):
 
 class UserCreate(BaseModel):
     """User creation model."""
-    email: str = Field(..., pattern=r'^[^@]+@[^@]+\.[^@]+$')
+    email: str = Field(..., pattern=EMAIL_PATTERN)
     username: str = Field(..., min_length=3, max_length=100)
     full_name: str = Field(..., min_length=1, max_length=255)
     role: str = Field(default="member")
@@ -140,15 +203,24 @@ async def get_current_user(_: HTTPAuthorizationCredentials = Security(security))
 
 async def get_organization(user: dict = Depends(get_current_user)):
     """Get user's organization"""
+    key = f"org:{user['organization_id']}"
+    cached = await redis_client.get(key)
+    if cached is not None:
+        return orjson.loads(cached)
+
     async with db_pool.acquire() as conn:
         org = await conn.fetchrow(
             "SELECT * FROM organizations WHERE id = $1",
             user["organization_id"]
         )
-        if not org:
-            raise HTTPException(
-                status_code=404, detail="Organization not found")
-        return dict(org)
+    if not org:
+        raise HTTPException(
+            status_code=404, detail="Organization not found")
+
+    # Round-trip through JSON so cache hits and misses return the same shape
+    payload = orjson.dumps(dict(org), default=str, option=ORJSON_OPTIONS)
+    await redis_client.setex(key, ORGANIZATION_CACHE_TTL_SECONDS, payload)
+    return orjson.loads(payload)
 
 # Rate Limiting
 
@@ -156,18 +228,117 @@ async def get_organization(user: dict = Depends(get_current_user)):
 async def check_rate_limit(user: dict = Depends(get_current_user)):
     """Check API rate limits"""
     key = f"rate_limit:{user['id']}"
-    current = await redis_client.get(key)
-
-    if current is None:
-        await redis_client.setex(key, 3600, 1)  # 1 hour window
-        return True
-
-    if int(current) >= 1000:  # 1000 requests per hour
+    now_ms = int(time.time() * 1000)
+    allowed = await rate_limit_script(
+        keys=[key],
+        args=[now_ms, RATE_LIMIT_WINDOW_SECONDS * 1000,
+              RATE_LIMIT_REQUESTS, f"{now_ms}-{uuid.uuid4().hex}"]
+    )
+
+    if not int(allowed):
         raise HTTPException(status_code=429, detail="Rate limit exceeded")
 
-    await redis_client.incr(key)
     return True
 
+# Pagination
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_OPTIONS = ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE
+
+
+def encode_cursor(*values) -> str:
+    """Encode the sort key of the last row as an opaque cursor"""
+    if any(value is None for value in values):
+        # A NULL key would round-trip as "None" and never compare in SQL
+        raise ValueError("Cursor sort keys must not be NULL")
+    payload = json.dumps([str(value) for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str, *converters: Callable[[str], Any]) -> List[Any]:
+    """Decode a cursor produced by encode_cursor into typed sort key values"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(converters):
+            raise ValueError("Unexpected cursor shape")
+        return [convert(value) for convert, value in zip(converters, values)]
+    except (ValueError, TypeError, AttributeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+
+def paginate(rows: list, limit: int, cursor_fields: List[str]) -> Dict[str, Any]:
+    """Build a keyset-paginated response from up to limit + 1 rows"""
+    items = [dict(row) for row in rows[:limit]]
+    has_next = len(rows) > limit
+    next_cursor = None
+    if has_next and items:
+        next_cursor = encode_cursor(*(items[-1][field] for field in cursor_fields))
+    return {
+        "data": items,
+        "pagination": {"limit": limit, "has_next": has_next, "next_cursor": next_cursor}
+    }
+
+
+async def stream_ndjson(query: str, params: list, limit: int,
+                        cursor_fields: List[str]) -> AsyncIterator[bytes]:
+    """Stream up to limit rows as NDJSON, followed by a pagination line"""
+    last_row = None
+    has_next = False
+    async with db_pool.acquire() as conn:
+        # Server-side cursors only live inside a transaction
+        async with conn.transaction():
+            count = 0
+            async for row in conn.cursor(query, *params):
+                if count == limit:
+                    has_next = True
+                    break
+                count += 1
+                last_row = row
+                yield orjson.dumps(dict(row), default=str, option=NDJSON_OPTIONS)
+
+    next_cursor = None
+    if has_next and last_row is not None:
+        next_cursor = encode_cursor(*(last_row[field] for field in cursor_fields))
+    pagination = {"limit": limit, "has_next": has_next, "next_cursor": next_cursor}
+    yield orjson.dumps({"pagination": pagination}, option=NDJSON_OPTIONS)
+
+
+async def list_response(request: Request, query: str, params: list, limit: int,
+                        cursor_fields: List[str]):
+    """Return a page as NDJSON when the client asks for it, else as JSON"""
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            stream_ndjson(query, params, limit, cursor_fields),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch(query, *params)
+    return paginate(rows, limit, cursor_fields)
+
+# SQL statements
+
+SQL_INSERT_ORGANIZATION = """
+    INSERT INTO organizations (name, slug, subscription_tier)
+    VALUES ($1, $2, $3) RETURNING id
+"""
+
+SQL_INSERT_PROJECT = """
+    INSERT INTO projects (organization_id, created_by, name, description, topic, priority)
+    VALUES ($1, $2, $3, $4, $5, $6) RETURNING id
+"""
+
+SQL_INSERT_ORCHESTRATION_RUN = """
+    INSERT INTO orchestration_runs (project_id, user_id, topic, integration_enabled, status)
+    VALUES ($1, $2, $3, $4, 'running') RETURNING id
+"""
+
+SQL_INSERT_TEMPLATE = """
+    INSERT INTO orchestration_templates
+        (organization_id, created_by, name, description, category, template_data, is_public)
+    VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING id
+"""
+
 # API Endpoints
 
 
@@ -196,8 +367,7 @@ async def create_organization(
     async with db_pool.acquire() as conn:
         try:
             org_id = await conn.fetchval(
-                """INSERT INTO organizations (name, slug, subscription_tier)
-                   VALUES ($1, $2, $3) RETURNING id""",
+                SQL_INSERT_ORGANIZATION,
                 org_data.name, org_data.slug, org_data.subscription_tier
             )
             return {"id": org_id, "message": "Organization created successfully"}
@@ -208,32 +378,34 @@ async def create_organization(
 
 @APP.get("/api/v1/projects")
 async def list_projects(
+    request: Request,
     status: Optional[str] = None,
-    limit: int = 50,
-    offset: int = 0,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
     user: dict = Depends(get_current_user),
     _: bool = Depends(check_rate_limit)
 ):
     """List projects for the organization"""
-    async with db_pool.acquire() as conn:
-        query = """
-            SELECT p.*, u.username as created_by_username
-            FROM projects p
-            LEFT JOIN users u ON p.created_by = u.id
-            WHERE p.organization_id = $1
-        """
-        params = [user["organization_id"]]
+    query = """
+        SELECT p.*, u.username as created_by_username
+        FROM projects p
+        LEFT JOIN users u ON p.created_by = u.id
+        WHERE p.organization_id = $1
+    """
+    params = [user["organization_id"]]
+
+    if status:
+        params.append(status)
+        query += f" AND p.status = ${len(params)}"
 
-        if status:
-            query += " AND p.status = $2"
-            params.append(status)
+    if cursor:
+        params.extend(decode_cursor(cursor, datetime.fromisoformat, uuid.UUID))
+        query += f" AND (p.created_at, p.id) < (${len(params) - 1}, ${len(params)})"
 
-        query += (f" ORDER BY p.created_at DESC LIMIT ${len(params) + 1} "
-                  f"OFFSET ${len(params) + 2}")
-        params.extend([limit, offset])
+    params.append(limit + 1)
+    query += f" ORDER BY p.created_at DESC, p.id DESC LIMIT ${len(params)}"
 
-        projects = await conn.fetch(query, *params)
-        return [dict(project) for project in projects]
+    return await list_response(request, query, params, limit, ["created_at", "id"])
 
 
 @APP.post("/api/v1/projects")
@@ -245,8 +417,7 @@ async def create_project(
     """Create a new project"""
     async with db_pool.acquire() as conn:
         project_id = await conn.fetchval(
-            """INSERT INTO projects (organization_id, created_by, name, description, topic, priority)
-               VALUES ($1, $2, $3, $4, $5, $6) RETURNING id""",
+            SQL_INSERT_PROJECT,
             user["organization_id"], user["id"], project_data.name,
             project_data.description, project_data.topic, project_data.priority
         )
@@ -256,7 +427,6 @@ async def create_project(
 @APP.post("/api/v1/orchestrate")
 async def start_orchestration(
     request: OrchestrationRequest,
-    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user),
     _: bool = Depends(check_rate_limit)
 ):
@@ -264,16 +434,15 @@ async def start_orchestration(
     async with db_pool.acquire() as conn:
         # Create orchestration run record
         run_id = await conn.fetchval(
-            """INSERT INTO orchestration_runs
-               (project_id, user_id, topic, integration_enabled, status)
-               VALUES ($1, $2, $3, $4, 'running') RETURNING id""",
+            SQL_INSERT_ORCHESTRATION_RUN,
             request.project_id, user["id"], request.topic, request.integration_enabled
         )
 
-        # Start background orchestration
-        background_tasks.add_task(
-            run_orchestration_background,
-            run_id, request.topic, request.integration_enabled
+        # Hand the run to the orchestration worker (worker/main.py)
+        await job_queue.enqueue_job(
+            'run_orchestration',
+            run_id, request.topic, request.integration_enabled,
+            _job_id=str(run_id)
         )
 
         return {
@@ -316,33 +485,42 @@ async def get_orchestration_status(
 
 @APP.get("/api/v1/templates")
 async def list_templates(
+    request: Request,
     category: Optional[str] = None,
     is_public: Optional[bool] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
     user: dict = Depends(get_current_user),
     _: bool = Depends(check_rate_limit)
 ):
     """List orchestration templates"""
-    async with db_pool.acquire() as conn:
-        query = """
-            SELECT t.*, u.username as created_by_username
-            FROM orchestration_templates t
-            LEFT JOIN users u ON t.created_by = u.id
-            WHERE (t.organization_id = $1 OR t.is_public = true)
-        """
-        params = [user["organization_id"]]
+    query = """
+        SELECT t.*, u.username as created_by_username
+        FROM orchestration_templates t
+        LEFT JOIN users u ON t.created_by = u.id
+        WHERE (t.organization_id = $1 OR t.is_public = true)
+    """
+    params = [user["organization_id"]]
+
+    if category:
+        params.append(category)
+        query += f" AND t.category = ${len(params)}"
 
-        if category:
-            query += " AND t.category = $2"
-            params.append(category)
+    if is_public is not None:
+        params.append(is_public)
+        query += f" AND t.is_public = ${len(params)}"
 
-        if is_public is not None:
-            query += f" AND t.is_public = ${len(params) + 1}"
-            params.append(is_public)
+    if cursor:
+        params.extend(decode_cursor(cursor, int, datetime.fromisoformat, uuid.UUID))
+        query += (f" AND (t.usage_count, t.created_at, t.id) < "
+                  f"(${len(params) - 2}, ${len(params) - 1}, ${len(params)})")
 
-        query += " ORDER BY t.usage_count DESC, t.created_at DESC"
+    params.append(limit + 1)
+    query += (" ORDER BY t.usage_count DESC, t.created_at DESC, t.id DESC"
+              f" LIMIT ${len(params)}")
 
-        templates = await conn.fetch(query, *params)
-        return [dict(template) for template in templates]
+    return await list_response(
+        request, query, params, limit, ["usage_count", "created_at", "id"])
 
 
 @APP.post("/api/v1/templates")
@@ -354,19 +532,17 @@ async def create_template(
     """Create a new orchestration template"""
     async with db_pool.acquire() as conn:
         template_id = await conn.fetchval(
-            """INSERT INTO orchestration_templates
-               (organization_id, created_by, name, description, category, template_data, is_public)
-               VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING id""",
+            SQL_INSERT_TEMPLATE,
             user["organization_id"], user["id"], template_data.name,
             template_data.description, template_data.category,
-            json.dumps(template_data.template_data), template_data.is_public
+            orjson.dumps(template_data.template_data).decode(), template_data.is_public
         )
         return {"id": template_id, "message": "Template created successfully"}
 
 
 @APP.get("/api/v1/analytics/usage")
 async def get_usage_analytics(
-    days: int = 30,
+    days: int = Query(default=30, ge=1, le=365),
     user: dict = Depends(get_current_user),
     _: bool = Depends(check_rate_limit)
 ):
@@ -374,77 +550,29 @@ async def get_usage_analytics(
     async with db_pool.acquire() as conn:
         # API usage over time
         api_usage = await conn.fetch(
-            f"""SELECT DATE(created_at) as date, COUNT(*) as requests, SUM(tokens_used) as tokens
+            """SELECT DATE(created_at) as date, COUNT(*) as requests, SUM(tokens_used) as tokens
                FROM api_usage
-               WHERE organization_id = $1 AND created_at >= NOW() - INTERVAL '{days} days'
+               WHERE organization_id = $1 AND created_at >= NOW() - make_interval(days => $2)
                GROUP BY DATE(created_at) ORDER BY date""",
-            user["organization_id"]
+            user["organization_id"], days
         )
 
         # Orchestration runs summary
         runs_summary = await conn.fetchrow(
-            f"""SELECT
+            """SELECT
                 COUNT(*) as total_runs,
                 COUNT(*) FILTER (WHERE status = 'completed') as completed_runs,
                 COUNT(*) FILTER (WHERE status = 'failed') as failed_runs,
                 AVG(execution_time_ms) as avg_execution_time
                FROM orchestration_runs
-               WHERE user_id = $1 AND created_at >= NOW() - INTERVAL '{days} days'""",
-            user["id"]
+               WHERE user_id = $1 AND created_at >= NOW() - make_interval(days => $2)""",
+            user["id"], days
         )
 
-        return {
-            "api_usage": [dict(row) for row in api_usage],
-            "runs_summary": dict(runs_summary) if runs_summary else {}
-        }
-
-# Background Tasks
-
-
-async def run_orchestration_background(run_id: uuid.UUID, topic: str, integration_enabled: bool):
-    """Background task to run orchestration"""
-    try:
-        # Import orchestrator here to avoid circular imports
-        from enhanced_orchestrator import EnhancedOrchestrator
-        from config import Config
-
-        config = Config()
-        orchestrator = EnhancedOrchestrator(config)
-        results = orchestrator.process_topic_enhanced(
-            topic, integration_enabled)
-
-        async with db_pool.acquire() as conn:
-            # Update run status
-            await conn.execute(
-                """UPDATE orchestration_runs
-                   SET status = 'completed', results = $1, completed_at = NOW(),
-                       success_rate = $2, completed_phases = $3
-                   WHERE id = $4""",
-                json.dumps(results),
-                float(results['metadata']['success_rate'].rstrip('%')),
-                results['metadata']['successful_phases'],
-                run_id
-            )
-
-            # Save phase executions
-            for phase_code, phase_data in results['phases'].items():
-                await conn.execute(
-                    """INSERT INTO phase_executions
-                       (run_id, phase_code, phase_name, status, response_text, completed_at)
-                       VALUES ($1, $2, $3, $4, $5, NOW())""",
-                    run_id, phase_code, phase_data['phase'],
-                    phase_data['status'], phase_data.get('response', '')
-                )
-
-    except (IOError, json.JSONDecodeError) as e:
-        logger.error("Orchestration failed for run %s: %s", run_id, e)
-        async with db_pool.acquire() as conn:
-            await conn.execute(
-                """UPDATE orchestration_runs
-                   SET status = 'failed', error_details = $1, completed_at = NOW()
-                   WHERE id = $2""",
-                json.dumps({"error": str(e)}), run_id
-            )
+    return {
+        "api_usage": [dict(row) for row in api_usage],
+        "runs_summary": dict(runs_summary) if runs_summary else {}
+    }
 
 
 def main():
@@ -1,78 +1,264 @@
 """
 Base class for orchestrators.
 """
-import json
+import asyncio
+import hashlib
 import logging
 import os
+import random
+import shelve
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 
+import httpx
 from jinja2 import Environment, FileSystemLoader
-from openai import OpenAI
+from openai import (APIConnectionError, APIError, AsyncOpenAI,
+                    AuthenticationError, InternalServerError, NotFoundError,
+                    PermissionDeniedError, RateLimitError)
 
 logger = logging.getLogger(__name__)
 
+# أخطاء OpenAI المؤقتة التي تستحق إعادة المحاولة (APITimeoutError يرث APIConnectionError)
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+# أخطاء تفشل فيها جميع المراحل بنفس الطريقة (مفتاح أو صلاحيات أو نموذج غير صحيح)
+FATAL_ERRORS = (AuthenticationError, PermissionDeniedError, NotFoundError)
+
+
+# عنصر نائب للموضوع في برومبت المراحل المجهز مسبقاً
+TOPIC_PLACEHOLDER = '{__TOPIC__}'
+
+
+class FatalOrchestratorError(IOError):
+    """خطأ لا فائدة من متابعة المراحل الأخرى بعده"""
+
+
+def create_openai_client(config):
+    """إنشاء عميل OpenAI غير متزامن يعيد استخدام اتصالات HTTP/2"""
+    # HTTP/2 يمرر الطلبات المتزامنة للمراحل عبر اتصال TLS واحد
+    http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(config.OPENAI_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=config.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=config.OPENAI_MAX_KEEPALIVE_CONNECTIONS)
+    )
+    return AsyncOpenAI(api_key=config.OPENAI_API_KEY, http_client=http_client)
+
+
+class DiskResponseCache:
+    """ذاكرة مؤقتة دائمة على القرص بواجهة get/setex نفسها لعميل redis"""
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        # shelve لا يدعم الوصول المتزامن، والمراحل تقرأ وتكتب من خيوط مختلفة
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    async def get(self, key):
+        """قراءة استجابة مخزنة ما لم تنته صلاحيتها"""
+        # عمليات القرص تتم في خيط منفصل حتى لا تعطل حلقة الأحداث
+        return await asyncio.to_thread(self._get, key)
+
+    async def setex(self, key, ttl, value):
+        """تخزين استجابة مع مدة صلاحية بالثواني"""
+        await asyncio.to_thread(self._set, key, ttl, value)
+
+    def _get(self, key):
+        """القراءة من الملف تحت القفل"""
+        with self._lock, shelve.open(self.path) as db:
+            entry = db.get(key)
+        if entry is None:
+            return None
+        expires_at, content = entry
+        return content if expires_at > time.time() else None
+
+    def _set(self, key, ttl, value):
+        """الكتابة في الملف مع التنظيف عند تجاوز الحد"""
+        now = time.time()
+        with self._lock, shelve.open(self.path) as db:
+            db[key] = (now + ttl, value)
+            if len(db) > self.max_entries:
+                self._prune(db, now)
+
+    def _prune(self, db, now):
+        """حذف المنتهية صلاحيتها ثم الأقرب انتهاءً حتى 90% من الحد"""
+        # الهامش يمنع تكرار المسح الكامل مع كل كتابة بعد بلوغ الحد
+        expiries = sorted((db[key][0], key) for key in db.keys())
+        excess = len(expiries) - self.max_entries * 9 // 10
+        for expires_at, key in expiries:
+            if expires_at > now and excess <= 0:
+                break
+            del db[key]
+            excess -= 1
 
 class BaseOrchestrator:
     """Base class for orchestrators."""
 
-    def __init__(self, config):
+    # بيئة Jinja مشتركة تحتفظ بالقوالب المحللة طوال عمر العملية
+    _ENV = Environment(loader=FileSystemLoader('prompts'),
+                       cache_size=-1, auto_reload=False)
+
+    # ذاكرة مؤقتة محلية (LRU) للاستجابات مشتركة بين جميع النسخ
+    _response_cache = OrderedDict()
+    # مهام Slack تعمل في خيوط متعددة، لذا تُحمى عمليات القراءة والحذف معاً
+    _response_cache_lock = threading.Lock()
+
+    # محتوى ملفات البرومبت الثابتة، يُقرأ مرة واحدة لكل عملية
+    _prompt_files = {}
+
+    # برومبت المراحل المجهز مسبقاً لكل مجموعة مراحل، مشترك بين جميع النسخ
+    _phase_prompt_cache = {}
+
+    # مراحل المنسق ثابتة، لذا تعرّفها الأصناف الفرعية كخاصية للصنف
+    phases = ()
+
+    def __init__(self, config, cache=None, client=None):
         self.config = config
-        self.client = OpenAI(api_key=self.config.OPENAI_API_KEY)
-        self.phases = []
+        # يمكن تمرير عميل مشترك لإعادة استخدام اتصالات HTTP بين النسخ
+        self.client = client or create_openai_client(self.config)
+        self.cache = cache  # عميل redis.asyncio اختياري كذاكرة مؤقتة مشتركة
+        self._system_content = self._read_prompt('prompts/system_prompt.md')
+        # تجزئة system prompt تُحسب مرة واحدة ثم تُنسخ لكل مفتاح
+        self._system_digest = hashlib.blake2b(
+            self._system_content.encode('utf-8') + b'\0', digest_size=16)
+
+    @classmethod
+    def _read_prompt(cls, path):
+        """قراءة ملف برومبت ثابت مع الاحتفاظ بمحتواه للنسخ اللاحقة"""
+        content = cls._prompt_files.get(path)
+        if content is None:
+            with open(path, 'r', encoding='utf-8') as file:
+                content = cls._prompt_files[path] = file.read()
+        return content
 
     def _load_template(self, name):
         """تحميل قالب من مجلد prompts"""
         try:
-            env = Environment(loader=FileSystemLoader('prompts'))
-            return env.get_template(name)
+            return self._ENV.get_template(name)
         except Exception as e:
             logger.error("خطأ في تحميل القالب %s: %s", name, e)
             raise
 
-    def call_model(self, prompt, max_retries=3):
+    async def call_model(self, prompt, max_retries=3, use_cache=True):
         """استدعاء نموذج OpenAI مع إعادة المحاولة"""
+        model = os.getenv('OPENAI_MODEL', 'gpt-4')
+        cache_key = self._cache_key(model, prompt) if use_cache else None
+        if use_cache:
+            cached = await self._get_cached_response(cache_key)
+            if cached is not None:
+                logger.debug("استخدام استجابة مخزنة: %s", cache_key)
+                return cached
+
         for attempt in range(max_retries):
             try:
-                # قراءة system prompt
-                with open('prompts/system_prompt.md', 'r', encoding='utf-8') as file:
-                    system_content = file.read()
-
-                response = self.client.chat.completions.create(
-                    model=os.getenv('OPENAI_MODEL', 'gpt-4'),
+                response = await self.client.chat.completions.create(
+                    model=model,
                     messages=[
-                        {'role': 'system', 'content': system_content},
+                        {'role': 'system', 'content': self._system_content},
                         {'role': 'user', 'content': prompt}
                     ],
                     max_tokens=2000,
                     temperature=0.7
                 )
 
-                return response.choices[0].message.content
+                content = response.choices[0].message.content
+                if use_cache:
+                    await self._cache_response(cache_key, content)
+                return content
 
-            except (IOError, json.JSONDecodeError) as e:
+            except APIError as e:
+                if isinstance(e, FATAL_ERRORS):
+                    logger.error("خطأ غير قابل للاستمرار من النموذج: %s", e)
+                    raise FatalOrchestratorError(str(e)) from e
                 logger.warning("المحاولة %s فشلت: %s", attempt + 1, e)
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) + 1  # Exponential backoff
+                if isinstance(e, RETRYABLE_ERRORS) and attempt < max_retries - 1:
+                    wait_time = self._retry_delay(attempt, e)
                     logger.info(
-                        "انتظار %s ثانية قبل المحاولة التالية...", wait_time)
-                    time.sleep(wait_time)
-                if attempt == max_retries - 1:
-                    logger.error(
-                        "فشل في استدعاء النموذج بعد %s محاولات", max_retries)
-                    return f"خطأ: لم يتمكن من الحصول على استجابة من النموذج. {str(e)}"
+                        "انتظار %.1f ثانية قبل المحاولة التالية...", wait_time)
+                    await asyncio.sleep(wait_time)
+                    continue
+                logger.error(
+                    "فشل في استدعاء النموذج بعد %s محاولات", attempt + 1)
+                return f"خطأ: لم يتمكن من الحصول على استجابة من النموذج. {str(e)}"
         return None
 
-    def process_topic(self, topic):
-        """معالجة موضوع عبر جميع المراحل"""
+    def _cache_key(self, model, prompt):
+        """مفتاح الذاكرة المؤقتة من system prompt والنموذج والبرومبت"""
+        digest = self._system_digest.copy()
+        for part in (model, prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return f'oai:{digest.hexdigest()}'
+
+    async def _get_cached_response(self, key):
+        """البحث في الذاكرة المحلية ثم في Redis"""
+        with self._response_cache_lock:
+            entry = self._response_cache.get(key)
+            if entry is not None:
+                expires_at, content = entry
+                if expires_at > time.monotonic():
+                    self._response_cache.move_to_end(key)
+                    return content
+                del self._response_cache[key]
+
+        if self.cache is None:
+            return None
+        try:
+            cached = await self.cache.get(key)
+        except Exception as e:
+            logger.warning("تعذر القراءة من الذاكرة المؤقتة: %s", e)
+            return None
+        if cached is None:
+            return None
+        content = cached.decode('utf-8') if isinstance(cached, bytes) else cached
+        self._remember_response(key, content)
+        return content
+
+    async def _cache_response(self, key, content):
+        """تخزين الاستجابة محلياً وفي Redis"""
+        if content is None:
+            return
+        self._remember_response(key, content)
+        if self.cache is None:
+            return
+        try:
+            await self.cache.setex(key, self.config.RESPONSE_CACHE_TTL, content)
+        except Exception as e:
+            logger.warning("تعذر الكتابة في الذاكرة المؤقتة: %s", e)
+
+    def _remember_response(self, key, content):
+        """إضافة استجابة إلى الذاكرة المحلية مع حذف الأقدم عند الامتلاء"""
+        cache = self._response_cache
+        with self._response_cache_lock:
+            cache[key] = (time.monotonic() + self.config.RESPONSE_CACHE_TTL, content)
+            cache.move_to_end(key)
+            while len(cache) > self.config.RESPONSE_CACHE_SIZE:
+                cache.popitem(last=False)
+
+    @staticmethod
+    def _retry_delay(attempt, error):
+        """حساب مدة الانتظار مع احترام Retry-After وإضافة jitter"""
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            wait_time = (2 ** attempt) + 1  # Exponential backoff
+            return wait_time + random.uniform(0, wait_time / 2)
+
+    async def process_topic(self, topic):
+        """معالجة موضوع عبر جميع المراحل بالتوازي"""
         logger.info("بدء معالجة الموضوع: %s", topic)
 
         try:
-            user_template = self._load_template('user_prompt_template.md')
-            user_template.render(topic=topic)
-            logger.info("تم تحميل قالب المستخدم بنجاح")
+            phase_prompts = self._phase_prompts()
+            logger.info("تم تحميل قالب المهام بنجاح")
         except IOError as e:
-            logger.error("خطأ في تحميل قالب المستخدم: %s", e)
+            logger.error("خطأ في تحميل قالب المهام: %s", e)
             return None
 
         outputs = {
@@ -84,44 +270,91 @@ class BaseOrchestrator:
             'phases': {}
         }
 
-        successful_phases = 0
+        # إدراج الموضوع في البرومبت المجهز مسبقاً لكل مرحلة
+        prompts = {
+            phase_code: phase_prompt.replace(TOPIC_PLACEHOLDER, topic)
+            for (phase_code, _), phase_prompt in zip(self.phases, phase_prompts)
+        }
 
-        for phase_code, phase_name in self.phases:
-            logger.info("معالجة %s: %s", phase_code, phase_name)
+        # تحديد عدد الاستدعاءات المتزامنة لاحترام حدود OpenAI
+        semaphore = asyncio.Semaphore(self.config.MAX_CONCURRENT_PHASES)
+        results = await self._gather_phases(
+            self._run_phase(semaphore, phase_code, phase_name, prompts[phase_code])
+            for phase_code, phase_name in self.phases
+        )
 
-            try:
-                task_tpl = self._load_template('task_prompt.md')
-                prompt_text = task_tpl.render(
-                    phase_name=f'{phase_code}: {phase_name}',
-                    task_name='Main Task',
-                    context=topic,
-                    task_description=f'Define the main goals and requirements for {phase_name} '
-                    f'given the topic: {topic}'
-                )
-
-                result = self.call_model(prompt_text)
+        successful_phases = 0
+        # المراحل الفاشلة تُجمع معاً، لذا يكفي توقيت واحد لها
+        failed_at = datetime.now().isoformat()
 
+        for (phase_code, phase_name), result in zip(self.phases, results):
+            if isinstance(result, IOError):
+                logger.error("خطأ في معالجة %s: %s", phase_code, result)
                 outputs['phases'][phase_code] = {
                     'phase': phase_name,
-                    'prompt': prompt_text,
-                    'response': result,
-                    'status': 'success',
-                    'timestamp': datetime.now().isoformat()
+                    'error': str(result),
+                    'status': 'failed',
+                    'timestamp': failed_at
                 }
-
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                outputs['phases'][phase_code] = result
                 successful_phases += 1
                 logger.info("تم إنجاز %s بنجاح", phase_code)
 
-            except IOError as e:
-                logger.error("خطأ في معالجة %s: %s", phase_code, e)
-                outputs['phases'][phase_code] = {
-                    'phase': phase_name,
-                    'error': str(e),
-                    'status': 'failed',
-                    'timestamp': datetime.now().isoformat()
-                }
-
         outputs['metadata']['successful_phases'] = successful_phases
         outputs['metadata']['success_rate'] = f"{(successful_phases/len(self.phases)*100):.1f}%"
 
         return outputs
+
+    def _phase_prompts(self):
+        """تجهيز برومبت كل مرحلة مرة واحدة مع عنصر نائب للموضوع"""
+        phase_prompts = self._phase_prompt_cache.get(self.phases)
+        if phase_prompts is None:
+            task_tpl = self._load_template('task_prompt.md')
+            phase_prompts = tuple(
+                task_tpl.render(
+                    phase_name=f'{phase_code}: {phase_name}',
+                    task_name='Main Task',
+                    context=TOPIC_PLACEHOLDER,
+                    task_description=f'Define the main goals and requirements for {phase_name} '
+                    f'given the topic: {TOPIC_PLACEHOLDER}'
+                )
+                for phase_code, phase_name, *_ in self.phases
+            )
+            self._phase_prompt_cache[self.phases] = phase_prompts
+        return phase_prompts
+
+    @staticmethod
+    async def _gather_phases(coroutines):
+        """تشغيل المراحل بالتوازي مع إلغاء المتبقي منها عند أول خطأ قاتل"""
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+
+        def cancel_on_fatal(task):
+            if not task.cancelled() and isinstance(task.exception(), FatalOrchestratorError):
+                for other in tasks:
+                    other.cancel()
+
+        for task in tasks:
+            task.add_done_callback(cancel_on_fatal)
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, FatalOrchestratorError):
+                raise result
+        return results
+
+    async def _run_phase(self, semaphore, phase_code, phase_name, prompt_text):
+        """تنفيذ مرحلة واحدة"""
+        async with semaphore:
+            logger.info("معالجة %s: %s", phase_code, phase_name)
+            result = await self.call_model(prompt_text)
+
+        return {
+            'phase': phase_name,
+            'prompt': prompt_text,
+            'response': result,
+            'status': 'success',
+            'timestamp': datetime.now().isoformat()
+        }
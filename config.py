@@ -15,6 +15,9 @@ class Config:
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4')
     OPENAI_MAX_TOKENS = int(os.getenv('OPENAI_MAX_TOKENS', '2000'))
     OPENAI_TEMPERATURE = float(os.getenv('OPENAI_TEMPERATURE', '0.7'))
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+    OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '32'))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', '16'))
 
     # Slack Configuration
     SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN')
@@ -30,9 +33,21 @@ class Config:
     EXAMPLES_DIR = 'examples'
     LOGS_DIR = 'logs'
 
+    # Slack Results Storage (0 keeps every saved run)
+    SAVE_SLACK_RESULTS = os.getenv('SAVE_SLACK_RESULTS', 'true').lower() == 'true'
+    MAX_SAVED_RESULTS_PER_USER = int(os.getenv('MAX_SAVED_RESULTS_PER_USER', '20'))
+
     # Processing Configuration
     MAX_RETRIES = int(os.getenv('MAX_RETRIES', '3'))
     RETRY_DELAY = int(os.getenv('RETRY_DELAY', '1'))
+    MAX_CONCURRENT_PHASES = int(os.getenv('MAX_CONCURRENT_PHASES', '3'))
+    MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '5'))
+
+    # Response Cache Configuration
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '86400'))
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '256'))
+    RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', '.orchestrator_cache/responses')
+    RESPONSE_CACHE_DISK_SIZE = int(os.getenv('RESPONSE_CACHE_DISK_SIZE', '5000'))
 
     @classmethod
     def validate_required_vars(cls, required_vars):
@@ -221,6 +221,19 @@ def extract_repo_data(repo_path, include_patterns=None, exclude_patterns=None):
     return extracted_data
 
 
+def iter_analysis_payloads(msg):
+    """
+    Yields per-file analysis payloads from a message. Batched messages carry an
+    'analyses' list of {source_file, analysis} entries and are expanded into one
+    payload per file; single-file messages are yielded unchanged.
+    """
+    if "analyses" not in msg:
+        yield msg
+        return
+    for entry in msg["analyses"]:
+        yield {"type": msg.get("type"), "repo": msg.get("repo"), **entry}
+
+
 # Define the DataCreatorAgent class
 class DataCreatorAgent(Agent):
     """Agent for creating data from various sources."""
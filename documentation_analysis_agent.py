@@ -1,16 +1,30 @@
 """
 This module defines the DocumentationAnalysisAgent class.
 """
+import re
+
 from data_creator_agent import Agent, ArchitectureEventType
 
+# Markdown ATX headings ("## Title") and underlined Markdown/reST headings
+# ("Title" followed by ===, ---, ~~~ or ^^^), matched in a single pass.
+HEADING_PATTERN = re.compile(
+    r'^(?:#{1,6}[ \t]+(?P<atx>[^\n]+?)[ \t#]*'
+    r'|(?P<underlined>[^\s][^\n]*)\n[=\-~^]{3,}[ \t]*)$',
+    re.MULTILINE
+)
+
+# Maximum number of file analyses published in a single bus message
+DEFAULT_BATCH_SIZE = 1000
+
 
 class DocumentationAnalysisAgent(Agent):
     """Agent for analyzing documentation files."""
 
     def __init__(self, name="DocumentationAnalysisAgent", message_bus=None, config=None):
         super().__init__(name=name, message_bus=message_bus, config=config)
-        self.doc_file_extensions = self.config.get(
-            "doc_extensions", ['.md', '.txt', '.rst'])
+        self.doc_file_extensions = tuple(self.config.get(
+            "doc_extensions", ('.md', '.txt', '.rst')))
+        self.batch_size = self.config.get("batch_size", DEFAULT_BATCH_SIZE)
         if self.message_bus:
             # This agent listens for the raw data from the first agent
             self.message_bus.subscribe(
@@ -25,27 +39,46 @@ class DocumentationAnalysisAgent(Agent):
 
             repo_name = msg.get('source_repo')
             files_data = msg.get('data', [])
+            batch = []
 
             for file_info in files_data:
                 file_path = file_info.get("file_path")
 
                 # Check if the file is a doc file we can parse
-                if any(file_path.endswith(ext) for ext in self.doc_file_extensions):
+                if file_path.endswith(self.doc_file_extensions):
                     try:
                         analysis_result = self.analyze_documentation(
                             file_info['content'])
-
-                        # Publish the structured analysis for this single file
-                        self.send({
-                            "type": ArchitectureEventType.ANALYZED_DOCUMENTATION,
+                        batch.append({
                             "source_file": file_path,
-                            "repo": repo_name,
                             "analysis": analysis_result
                         })
                     except Exception as e:
                         print(f"Error analyzing {file_path}: {e}")
 
+                if len(batch) >= self.batch_size:
+                    self.publish_batch(repo_name, batch)
+                    batch = []
+
+            if batch:
+                self.publish_batch(repo_name, batch)
+
+    def publish_batch(self, repo_name, batch):
+        """Publishes the analyses of several files as one message."""
+        self.send({
+            "type": ArchitectureEventType.ANALYZED_DOCUMENTATION,
+            "repo": repo_name,
+            "analyses": batch
+        })
+
     def analyze_documentation(self, content):
         """Parses documentation and extracts structure."""
-        # This is a placeholder and should be implemented with a proper documentation parser
-        return {"summary": content[:100], "sections": {}}
+        sections = {}
+        matches = list(HEADING_PATTERN.finditer(content))
+        for match, next_match in zip(matches, matches[1:] + [None]):
+            title = (match.group('atx') or match.group('underlined')).strip()
+            end = next_match.start() if next_match else len(content)
+            body = content[match.end():end].strip()
+            if body:
+                sections[title] = body
+        return {"summary": content[:100], "sections": sections}
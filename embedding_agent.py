@@ -1,7 +1,17 @@
 """
 This module defines the EmbeddingAgent class.
 """
-from data_creator_agent import Agent, ArchitectureEventType
+import asyncio
+import json
+import logging
+
+from data_creator_agent import (Agent, ArchitectureEventType,
+                                iter_analysis_payloads)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_EMBEDDING_BATCH_SIZE = 32
 
 
 class EmbeddingAgent(Agent):
@@ -9,6 +19,12 @@ class EmbeddingAgent(Agent):
 
     def __init__(self, name="EmbeddingAgent", message_bus=None, config=None):
         super().__init__(name=name, message_bus=message_bus, config=config)
+        self.model_name = self.config.get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+        self.batch_size = self.config.get(
+            "embedding_batch_size", DEFAULT_EMBEDDING_BATCH_SIZE)
+        # None picks CUDA when available, otherwise the CPU
+        self.device = self.config.get("embedding_device")
+        self._model = None
         if self.message_bus:
             self.message_bus.subscribe(
                 ArchitectureEventType.ANALYZED_CODE_STRUCTURE, self)
@@ -19,24 +35,57 @@ class EmbeddingAgent(Agent):
         """Handle incoming messages."""
         if msg.get("type") in [ArchitectureEventType.ANALYZED_CODE_STRUCTURE,
                                ArchitectureEventType.ANALYZED_DOCUMENTATION]:
+            payloads = list(iter_analysis_payloads(msg))
             print(
-                f"{self.name}: Received analyzed data for '{msg.get('source_file')}'. "
+                f"{self.name}: Received analyzed data for {len(payloads)} file(s). "
                 "Generating embeddings...")
 
             try:
-                embedding = self.generate_embedding(msg.get('analysis'))
+                # Encode every file of the message in one batched forward pass,
+                # off the event loop so other agents keep running
+                embeddings = await asyncio.to_thread(
+                    self.generate_embeddings,
+                    [payload.get('analysis') for payload in payloads])
+            except Exception:
+                logger.exception("Error generating embeddings for %s", msg.get('repo'))
+                return
 
-                # Publish the structured analysis for this single file
+            for payload, embedding in zip(payloads, embeddings):
+                # Publish the embedding for this single file
                 self.send({
                     "type": ArchitectureEventType.DATA_EMBEDDING_COMPLETE,
-                    "original_payload": msg,
+                    "original_payload": payload,
                     "embedding_vector": embedding
                 })
-            except Exception as e:
-                print(f"Error analyzing {msg.get('source_file')}: {e}")
 
     def generate_embedding(self, analysis):
         """Generates embeddings for the given analysis."""
-        # This is a placeholder and should be implemented with a proper embedding model
-        _ = analysis
-        return [0.1, 0.2, 0.3]
+        return self.generate_embeddings([analysis])[0]
+
+    def generate_embeddings(self, analyses):
+        """Generates embeddings for several analyses in batches."""
+        texts = [analysis if isinstance(analysis, str)
+                 else json.dumps(analysis, ensure_ascii=False, sort_keys=True, default=str)
+                 for analysis in analyses]
+        vectors = self._get_model().encode(
+            texts, batch_size=self.batch_size, convert_to_numpy=True)
+        return vectors.tolist()
+
+    def _get_model(self):
+        """Loads the sentence-transformers model on first use."""
+        if self._model is None:
+            # Imported lazily: the dependencies are heavy and only needed by this agent
+            try:
+                import torch
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError(
+                    "EmbeddingAgent needs sentence-transformers; install it with "
+                    "'pip install -r requirements-embeddings.txt'") from e
+
+            device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+            self._model = SentenceTransformer(self.model_name, device=device)
+            if device.startswith("cuda"):
+                # FP16 halves memory traffic and runs the encoder on tensor cores
+                self._model.half()
+        return self._model
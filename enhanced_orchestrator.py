@@ -2,54 +2,67 @@
 محرك التنسيق المحسن مع قدرات التكامل المباشر
 """
 import argparse
-import json
+import asyncio
 import logging
-import os
+import re
 import sys
 import time
 from datetime import datetime
+from itertools import groupby
+from pathlib import Path
 
+import orjson
 from dotenv import load_dotenv
 from jinja2 import Environment, FileSystemLoader
 from openai import OpenAI
 
-from base_orchestrator import BaseOrchestrator
+from base_orchestrator import (TOPIC_PLACEHOLDER, BaseOrchestrator,
+                               DiskResponseCache, FatalOrchestratorError)
 from config import Config
-from system_integrator import SystemIntegrator
+from utils import queued_handler
+from system_integrator import INTEGRATION_LOG_FILE, SystemIntegrator
 
 # تحميل متغيرات البيئة
 load_dotenv()
 
-# إعداد التسجيل
+# إعداد التسجيل؛ الملف لا يُفتح إلا عند أول سجل
+log_file_handler = logging.FileHandler('enhanced_orchestrator.log', encoding='utf-8', delay=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('enhanced_orchestrator.log', encoding='utf-8'),
+    # الكتابة في الملف والطرفية تتم من خيط خلفي حتى لا تعطل المراحل
+    handlers=[queued_handler(
+        log_file_handler,
         logging.StreamHandler()
-    ]
+    )]
 )
 logger = logging.getLogger(__name__)
 
+# كتلة ```json كاملة: سطر الافتتاح ثم المحتوى حتى أول سطر يحتوي على ```
+JSON_BLOCK_PATTERN = re.compile(
+    r'^[^\n]*```json[^\n]*\n(.*?)^[^\n]*```[^\n]*$', re.MULTILINE | re.DOTALL)
+
 
 class EnhancedOrchestrator(BaseOrchestrator):
     """محرك التنسيق المحسن مع التكامل المباشر"""
 
-    def __init__(self, config):
-        super().__init__(config)
-        self.system_integrator = SystemIntegrator(self.config)
-        self.phases = [
-            ('Phase 0', 'Ideation', True),
-            ('Phase 1', 'Research', True),
-            ('Phase 2', 'Design', True),
-            ('Phase 3', 'Development Plan', True),
-            ('Phase 4', 'Execution', True),  # مرحلة التنفيذ المباشر
-            ('Phase 5', 'Review & Optimize', True),
-            ('Phase 6', 'Deploy & Integrate', True)  # مرحلة جديدة للنشر والتكامل
-        ]
-
-    def call_model_with_integration(self, prompt: str, enable_integration: bool = False,
-                                      max_retries: int = 3):
+    phases = (
+        ('Phase 0', 'Ideation', True),
+        ('Phase 1', 'Research', True),
+        ('Phase 2', 'Design', True),
+        ('Phase 3', 'Development Plan', True),
+        ('Phase 4', 'Execution', True),  # مرحلة التنفيذ المباشر
+        ('Phase 5', 'Review & Optimize', True),
+        ('Phase 6', 'Deploy & Integrate', True)  # مرحلة جديدة للنشر والتكامل
+    )
+
+    def __init__(self, config, cache=None, client=None, http_client=None):
+        super().__init__(config, cache, client)
+        # عميل HTTP مشترك اختياري لاستدعاءات API، وإلا ينشئ المكامل عميله عند الحاجة
+        self.system_integrator = SystemIntegrator(self.config, http_client=http_client)
+
+    async def call_model_with_integration(self, prompt: str, enable_integration: bool = False,
+                                          max_retries: int = 3):
         """استدعاء النموذج مع إمكانية التكامل المباشر"""
 
         # إضافة تعليمات التكامل للنموذج
@@ -57,7 +70,9 @@ class EnhancedOrchestrator(BaseOrchestrator):
             integration_prompt = self._get_integration_prompt()
             prompt = f"{prompt}\n\n{integration_prompt}"
 
-        return self.call_model(prompt, max_retries)
+        # طلبات التكامل لها آثار جانبية، لذا لا تُعاد من الذاكرة المؤقتة
+        return await self.call_model(prompt, max_retries,
+                                     use_cache=not enable_integration)
 
     def _get_integration_prompt(self) -> str:
         """الحصول على تعليمات التكامل للنموذج"""
@@ -120,80 +135,78 @@ class EnhancedOrchestrator(BaseOrchestrator):
 
     def _process_integration_requests(self, response_content: str) -> str:
         """معالجة طلبات التكامل في الاستجابة"""
-        lines = response_content.split('\n')
-        processed_lines = []
-        integration_results = []
-
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-
-            # البحث عن طلبات التكامل
-            if '```json' in line and i + 1 < len(lines):
-                json_content = ""
-                i += 1
-
-                # جمع محتوى JSON
-                while i < len(lines) and '```' not in lines[i]:
-                    json_content += lines[i] + '\n'
-                    i += 1
-
-                # محاولة معالجة طلب التكامل
-                try:
-                    request_data = json.loads(json_content.strip())
-                    if 'integration_request' in request_data:
-                        result = self._execute_integration_request(
-                            request_data['integration_request'])
-                        integration_results.append(result)
-
-                        # إضافة نتيجة التنفيذ للاستجابة
-                        processed_lines.append(
-                            f"✅ **تم تنفيذ العملية:** {result['message']}"
-                            if result['success'] else f"❌ **خطأ في التنفيذ:** {result['error']}")
-                    else:
-                        processed_lines.append('```json')
-                        processed_lines.append(json_content.strip())
-                        processed_lines.append('```')
-                except json.JSONDecodeError:
-                    processed_lines.append('```json')
-                    processed_lines.append(json_content.strip())
-                    processed_lines.append('```')
-                except (IOError, json.JSONDecodeError) as e:
-                    processed_lines.append(f"❌ **خطأ في التنفيذ:** {str(e)}")
+        matches = list(JSON_BLOCK_PATTERN.finditer(response_content))
+
+        # المرور الأول: استخراج طلبات التكامل من كتل JSON
+        blocks = []
+        integration_requests = []
+        for match in matches:
+            json_content = match.group(1).strip()
+            try:
+                request_data = orjson.loads(json_content)
+            except orjson.JSONDecodeError:
+                request_data = None
+            if request_data is not None and 'integration_request' in request_data:
+                blocks.append(len(integration_requests))
+                integration_requests.append(request_data['integration_request'])
             else:
-                processed_lines.append(line)
+                blocks.append(f"```json\n{json_content}\n```")
+
+        # تنفيذ الطلبات على دفعات ثم إعادة بناء الاستجابة
+        integration_results = self._execute_integration_requests(integration_requests)
 
-            i += 1
+        parts = []
+        position = 0
+        for match, block in zip(matches, blocks):
+            parts.append(response_content[position:match.start()])
+            position = match.end()
+            if isinstance(block, str):
+                parts.append(block)
+                continue
+
+            # إضافة نتيجة التنفيذ للاستجابة
+            result = integration_results[block]
+            parts.append(
+                f"✅ **تم تنفيذ العملية:** {result['message']}"
+                if result['success'] else f"❌ **خطأ في التنفيذ:** {result['error']}")
+
+        parts.append(response_content[position:])
 
         # إضافة ملخص العمليات المنفذة
         if integration_results:
-            processed_lines.append("\n## ملخص العمليات المنفذة:")
+            parts.append("\n\n## ملخص العمليات المنفذة:")
             for i, result in enumerate(integration_results, 1):
                 status = "✅" if result['success'] else "❌"
-                processed_lines.append(
-                    f"{i}. {status} {result.get('message', result.get('error', 'عملية غير محددة'))}")
+                parts.append(
+                    f"\n{i}. {status} {result.get('message', result.get('error', 'عملية غير محددة'))}")
 
-        return '\n'.join(processed_lines)
+        return ''.join(parts)
 
-    def _execute_integration_request(self, request: dict) -> dict:
-        """تنفيذ طلب التكامل"""
-        request_type = request.get('type')
-        parameters = request.get('parameters', {})
+    def _execute_integration_requests(self, requests: list) -> list:
+        """تنفيذ طلبات التكامل مجمعة حسب النوع مع الحفاظ على ترتيبها"""
+        results = []
 
-        logger.info("تنفيذ طلب تكامل: %s", request_type)
+        # تجميع الطلبات المتتالية من نفس النوع فقط حتى لا يتغير ترتيب التنفيذ
+        for request_type, group in groupby(requests, key=lambda request: request.get('type')):
+            params_list = [request.get('parameters', {}) for request in group]
+            logger.info("تنفيذ %s من طلبات التكامل: %s", len(params_list), request_type)
+            try:
+                results.extend(
+                    self.system_integrator.execute_batch(request_type, params_list))
+            except IOError as e:
+                results.extend({'success': False, 'error': str(e)} for _ in params_list)
 
-        return self.system_integrator.execute_ai_request(request_type, parameters)
+        return results
 
-    def process_topic_enhanced(self, topic: str, enable_integration: bool = False):
+    async def process_topic_enhanced(self, topic: str, enable_integration: bool = False):
         """معالجة موضوع مع التكامل المحسن"""
         logger.info("بدء المعالجة المحسنة للموضوع: %s", topic)
 
         try:
-            user_template = self._load_template('user_prompt_template.md')
-            user_template.render(topic=topic)
-            logger.info("تم تحميل قالب المستخدم بنجاح")
+            phase_prompts = self._phase_prompts()
+            logger.info("تم تحميل قالب المهام بنجاح")
         except IOError as e:
-            logger.error("خطأ في تحميل قالب المستخدم: %s", e)
+            logger.error("خطأ في تحميل قالب المهام: %s", e)
             return None
 
         outputs = {
@@ -207,56 +220,66 @@ class EnhancedOrchestrator(BaseOrchestrator):
             'integration_log': []
         }
 
-        successful_phases = 0
-
-        for phase_code, phase_name, integration_allowed in self.phases:
-            logger.info("معالجة %s: %s", phase_code, phase_name)
-
-            try:
-                task_tpl = self._load_template('task_prompt.md')
-                prompt_text = task_tpl.render(
-                    phase_name=f'{phase_code}: {phase_name}',
-                    task_name='Main Task',
-                    context=topic,
-                    task_description=f'Define the main goals and requirements for {phase_name} '
-                    f'given the topic: {topic}'
-                )
+        # إدراج الموضوع في البرومبت المجهز مسبقاً لكل مرحلة
+        prompts = {
+            phase_code: phase_prompt.replace(TOPIC_PLACEHOLDER, topic)
+            for (phase_code, _, _), phase_prompt in zip(self.phases, phase_prompts)
+        }
 
-                # تفعيل التكامل للمراحل المسموحة
-                phase_integration = enable_integration and integration_allowed
+        # المراحل مستقلة عن بعضها، لذا تُرسل بالتوازي مع تحديد عدد الاستدعاءات المتزامنة
+        semaphore = asyncio.Semaphore(self.config.MAX_CONCURRENT_PHASES)
+        results = await self._gather_phases(
+            self._run_enhanced_phase(semaphore, phase_code, phase_name,
+                                     prompts[phase_code],
+                                     enable_integration and integration_allowed)
+            for phase_code, phase_name, integration_allowed in self.phases
+        )
 
-                result = self.call_model_with_integration(
-                    prompt_text, phase_integration)
+        successful_phases = 0
+        # المراحل الفاشلة تُجمع معاً، لذا يكفي توقيت واحد لها
+        failed_at = datetime.now().isoformat()
 
+        for (phase_code, phase_name, _), result in zip(self.phases, results):
+            if isinstance(result, IOError):
+                logger.error("خطأ في معالجة %s: %s", phase_code, result)
                 outputs['phases'][phase_code] = {
                     'phase': phase_name,
-                    'prompt': prompt_text,
-                    'response': result,
-                    'status': 'success',
-                    'integration_enabled': phase_integration,
-                    'timestamp': datetime.now().isoformat()
+                    'error': str(result),
+                    'status': 'failed',
+                    'timestamp': failed_at
                 }
-
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                outputs['phases'][phase_code] = result
                 successful_phases += 1
                 logger.info("تم إنجاز %s بنجاح", phase_code)
 
-            except IOError as e:
-                logger.error("خطأ في معالجة %s: %s", phase_code, e)
-                outputs['phases'][phase_code] = {
-                    'phase': phase_name,
-                    'error': str(e),
-                    'status': 'failed',
-                    'timestamp': datetime.now().isoformat()
-                }
-
         outputs['metadata']['successful_phases'] = successful_phases
         outputs['metadata']['success_rate'] = f"{(successful_phases/len(self.phases)*100):.1f}%"
 
-        # إضافة سجل التكامل
+        # إضافة ملخص سجل التكامل؛ التفاصيل الكاملة في ملف السجل
         outputs['integration_log'] = self.system_integrator.get_execution_history()
+        outputs['integration_log_file'] = INTEGRATION_LOG_FILE
 
         return outputs
 
+    async def _run_enhanced_phase(self, semaphore, phase_code, phase_name, prompt_text,
+                                  phase_integration):
+        """تنفيذ مرحلة واحدة مع التكامل إن كان مسموحاً"""
+        async with semaphore:
+            logger.info("معالجة %s: %s", phase_code, phase_name)
+            result = await self.call_model_with_integration(
+                prompt_text, phase_integration)
+
+        return {
+            'phase': phase_name,
+            'prompt': prompt_text,
+            'response': result,
+            'status': 'success',
+            'integration_enabled': phase_integration,
+            'timestamp': datetime.now().isoformat()
+        }
 
 def main():
     """Main function to run the orchestrator from the command line."""
@@ -269,27 +292,37 @@ def main():
                         help='تفعيل التكامل المباشر')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='تفعيل الوضع المفصل')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='تعطيل الذاكرة المؤقتة للاستجابات على القرص')
     args = parser.parse_args()
 
     # تعديل مستوى التسجيل حسب الطلب
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
-    # إنشاء مجلد examples إذا لم يكن موجوداً
-    os.makedirs('examples', exist_ok=True)
+    # إنشاء مجلد ملف الإخراج إذا لم يكن موجوداً
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # إنشاء المحرك المحسن
     config = Config()
-    orchestrator = EnhancedOrchestrator(config)
+    # إعادة استخدام استجابات التشغيلات السابقة لنفس البرومبت
+    cache = None if args.no_cache else DiskResponseCache(
+        config.RESPONSE_CACHE_PATH, max_entries=config.RESPONSE_CACHE_DISK_SIZE)
+    orchestrator = EnhancedOrchestrator(config, cache=cache)
 
     # معالجة الموضوع
-    results = orchestrator.process_topic_enhanced(
-        args.input, args.enable_integration)
+    try:
+        results = asyncio.run(orchestrator.process_topic_enhanced(
+            args.input, args.enable_integration))
+    except FatalOrchestratorError as e:
+        # خطأ في الإعدادات كالمفتاح أو النموذج، لا تفيد إعادة المحاولة دون إصلاحه
+        logger.error("توقفت المعالجة بسبب خطأ لا يمكن المتابعة بعده: %s", e)
+        sys.exit(1)
 
     if results:
         # حفظ النتائج
-        with open(args.output, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        output_path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
 
         logger.info("تم حفظ النتائج في: %s", args.output)
         print("\n✅ تم إنجاز المعالجة المحسنة بنجاح!")
@@ -303,7 +336,7 @@ def main():
         if args.enable_integration and results['integration_log']:
             print(f"\n🔗 عمليات التكامل المنفذة: {len(results['integration_log'])}")
             for i, log_entry in enumerate(results['integration_log'], 1):
-                log_status = "✅" if log_entry['result']['success'] else "❌"
+                log_status = "✅" if log_entry['success'] else "❌"
                 print(f"  {i}. {log_status} {log_entry['request_type']}")
     else:
         logger.error("فشل في معالجة الموضوع")
@@ -6,14 +6,13 @@ interface ApiResponse<T = any> {
   error?: string;
 }
 
+// Keyset pagination: pass `next_cursor` back as `cursor` to fetch the next page
 interface PaginatedResponse<T> {
   data: T[];
   pagination: {
-    total: number;
     limit: number;
-    offset: number;
     has_next: boolean;
-    has_prev: boolean;
+    next_cursor: string | null;
   };
 }
 
@@ -134,7 +133,7 @@ class ApiClient {
     status?: string;
     priority?: string;
     limit?: number;
-    offset?: number;
+    cursor?: string;
     search?: string;
   }): Promise<PaginatedResponse<Project>> {
     const response = await this.client.get('/projects', { params });
@@ -189,7 +188,7 @@ class ApiClient {
     project_id?: string;
     status?: string;
     limit?: number;
-    offset?: number;
+    cursor?: string;
   }): Promise<PaginatedResponse<OrchestrationRun>> {
     const response = await this.client.get('/orchestration', { params });
     return response.data;
@@ -205,7 +204,9 @@ class ApiClient {
     category?: string;
     is_public?: boolean;
     search?: string;
-  }): Promise<ApiResponse> {
+    limit?: number;
+    cursor?: string;
+  }): Promise<PaginatedResponse<Record<string, any>>> {
     const response = await this.client.get('/templates', { params });
     return response.data;
   }
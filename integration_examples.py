@@ -1,6 +1,7 @@
 """
 أمثلة على استخدام قدرات التكامل المباشر
 """
+import re
 
 # مثال 1: إنشاء مشروع Flask جديد
 FLASK_PROJECT_EXAMPLE = {
@@ -421,18 +422,25 @@ jobs:
     ]
 }
 
+# الأمثلة حسب الكلمة المفتاحية، بترتيب الأولوية عند تطابق أكثر من كلمة
+EXAMPLES_BY_KEYWORD = {
+    'flask': FLASK_PROJECT_EXAMPLE,
+    'database': DATABASE_SETUP_EXAMPLE,
+    'react': REACT_PROJECT_EXAMPLE,
+    'docker': DOCKER_SETUP_EXAMPLE,
+    'github': GITHUB_ACTIONS_EXAMPLE
+}
+
+EXAMPLE_KEYWORD_PATTERN = re.compile('|'.join(EXAMPLES_BY_KEYWORD), re.IGNORECASE)
+
+
 def get_example_by_topic(topic_keyword):
     """الحصول على مثال حسب الموضوع"""
-    examples = {
-        'flask': FLASK_PROJECT_EXAMPLE,
-        'database': DATABASE_SETUP_EXAMPLE,
-        'react': REACT_PROJECT_EXAMPLE,
-        'docker': DOCKER_SETUP_EXAMPLE,
-        'github': GITHUB_ACTIONS_EXAMPLE
-    }
-
-    for key, example in examples.items():
-        if key in topic_keyword.lower():
+    # مسح واحد للموضوع بدلاً من البحث عن كل كلمة مفتاحية على حدة
+    found = {match.group(0).lower()
+             for match in EXAMPLE_KEYWORD_PATTERN.finditer(topic_keyword)}
+    for key, example in EXAMPLES_BY_KEYWORD.items():
+        if key in found:
             return example
 
     return None
@@ -2,27 +2,32 @@
 AI Orchestrator for project planning and execution.
 """
 import argparse
-import json
+import asyncio
 import logging
 import os
 import sys
+from pathlib import Path
 
+import orjson
 from dotenv import load_dotenv
 
-from base_orchestrator import BaseOrchestrator
+from base_orchestrator import BaseOrchestrator, DiskResponseCache, FatalOrchestratorError
 from config import Config
+from utils import queued_handler
 
 # تحميل متغيرات البيئة
 load_dotenv()
 
-# إعداد التسجيل
+# إعداد التسجيل؛ الملف لا يُفتح إلا عند أول سجل
+log_file_handler = logging.FileHandler('orchestrator.log', encoding='utf-8', delay=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('orchestrator.log', encoding='utf-8'),
+    # الكتابة في الملف والطرفية تتم من خيط خلفي حتى لا تعطل المراحل
+    handlers=[queued_handler(
+        log_file_handler,
         logging.StreamHandler()
-    ]
+    )]
 )
 logger = logging.getLogger(__name__)
 
@@ -42,24 +47,18 @@ def validate_environment():
 class Orchestrator(BaseOrchestrator):
     """Orchestrator for project planning and execution."""
 
-    def __init__(self, config):
-        super().__init__(config)
-        self.phases = [
-            ('Phase 0', 'Ideation'),
-            ('Phase 1', 'Research'),
-            ('Phase 2', 'Design'),
-            ('Phase 3', 'Development Plan'),
-            ('Phase 4', 'Execution'),
-            ('Phase 5', 'Review & Optimize'),
-        ]
+    phases = (
+        ('Phase 0', 'Ideation'),
+        ('Phase 1', 'Research'),
+        ('Phase 2', 'Design'),
+        ('Phase 3', 'Development Plan'),
+        ('Phase 4', 'Execution'),
+        ('Phase 5', 'Review & Optimize'),
+    )
 
 
 def main():
     """Main function to run the orchestrator from the command line."""
-    # التحقق من متغيرات البيئة
-    if not validate_environment():
-        sys.exit(1)
-
     parser = argparse.ArgumentParser(
         description='AI Orchestrator for project planning')
     parser.add_argument('--input', required=True, help='موضوع المشروع')
@@ -67,24 +66,38 @@ def main():
                         help='ملف الإخراج')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='تفعيل الوضع المفصل')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='تعطيل الذاكرة المؤقتة للاستجابات على القرص')
     args = parser.parse_args()
 
+    # التحقق من متغيرات البيئة بعد قراءة المعاملات حتى يعمل --help بدونها
+    if not validate_environment():
+        sys.exit(1)
+
     # تعديل مستوى التسجيل حسب الطلب
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
-    # إنشاء مجلد examples إذا لم يكن موجوداً
-    os.makedirs('examples', exist_ok=True)
+    # إنشاء مجلد ملف الإخراج إذا لم يكن موجوداً
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # معالجة الموضوع
     config = Config()
-    orchestrator = Orchestrator(config)
-    results = orchestrator.process_topic(args.input)
+    # إعادة استخدام استجابات التشغيلات السابقة لنفس البرومبت
+    cache = None if args.no_cache else DiskResponseCache(
+        config.RESPONSE_CACHE_PATH, max_entries=config.RESPONSE_CACHE_DISK_SIZE)
+    orchestrator = Orchestrator(config, cache=cache)
+    try:
+        results = asyncio.run(orchestrator.process_topic(args.input))
+    except FatalOrchestratorError as e:
+        # خطأ في الإعدادات كالمفتاح أو النموذج، لا تفيد إعادة المحاولة دون إصلاحه
+        logger.error("توقفت المعالجة بسبب خطأ لا يمكن المتابعة بعده: %s", e)
+        sys.exit(1)
 
     if results:
         # حفظ النتائج
-        with open(args.output, 'w', encoding='utf-8') as file:
-            json.dump(results, file, ensure_ascii=False, indent=2)
+        output_path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
 
         logger.info("تم حفظ النتائج في: %s", args.output)
         print("\n✅ تم إنجاز المعالجة بنجاح!")
@@ -1,19 +1,24 @@
 """
 Slack bot for interacting with the AI Orchestrator.
 """
-import json
+import asyncio
+import atexit
 import logging
 import os
 import sys
-import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
 
+import orjson
 from dotenv import load_dotenv
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
+from base_orchestrator import FatalOrchestratorError
 from orchestrator import Orchestrator
 from config import Config
+from utils import queued_handler, truncate_text
 
 # تحميل متغيرات البيئة
 load_dotenv()
@@ -22,19 +27,30 @@ load_dotenv()
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('slack_app.log', encoding='utf-8'),
+    # الكتابة في الملف والطرفية تتم من خيط خلفي حتى لا تعطل معالجة الطلبات
+    handlers=[queued_handler(
+        logging.FileHandler('slack_app.log', encoding='utf-8', delay=True),
         logging.StreamHandler()
-    ]
+    )],
+    # استيراد orchestrator يهيئ التسجيل مسبقاً، لذا تُستبدل معالجاته هنا
+    force=True
 )
 logger = logging.getLogger(__name__)
 
+# الإعدادات تُقرأ من البيئة مرة واحدة وتُشارك بين جميع الطلبات
+config = Config()
+
+# خيوط دائمة لتنفيذ الطلبات الطويلة، بعدد محدود لحماية الذاكرة
+executor = ThreadPoolExecutor(
+    max_workers=config.MAX_CONCURRENT_REQUESTS, thread_name_prefix='orchestrate')
+atexit.register(executor.shutdown, wait=False)
+
 
 def validate_slack_environment():
     """التحقق من متغيرات البيئة المطلوبة لـ Slack"""
-    required_vars = ['SLACK_BOT_TOKEN',
-                     'SLACK_SIGNING_SECRET', 'OPENAI_API_KEY']
-    missing_vars = [var for var in required_vars if not os.getenv(var)]
+    # القيم قُرئت من البيئة مرة واحدة عند تحميل Config
+    missing_vars = config.validate_required_vars(
+        ('SLACK_BOT_TOKEN', 'SLACK_SIGNING_SECRET', 'OPENAI_API_KEY'))
 
     if missing_vars:
         logger.error("متغيرات البيئة المفقودة: %s", ', '.join(missing_vars))
@@ -42,36 +58,56 @@ def validate_slack_environment():
     return True
 
 
+def save_results(results, user_id):
+    """حفظ النتائج في ملف مع الاحتفاظ بآخر الملفات فقط لكل مستخدم"""
+    examples_dir = Path(config.EXAMPLES_DIR)
+    examples_dir.mkdir(exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = examples_dir / f"slack_run_{user_id}_{timestamp}.json"
+    path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+
+    # حذف أقدم الملفات حتى لا يكبر المجلد بلا حدود
+    if config.MAX_SAVED_RESULTS_PER_USER:
+        saved_runs = sorted(examples_dir.glob(f"slack_run_{user_id}_*.json"))
+        for old_run in saved_runs[:-config.MAX_SAVED_RESULTS_PER_USER]:
+            old_run.unlink()
+
+    return path
+
+
+async def run_orchestrator(topic):
+    """تشغيل المعالجة ثم إغلاق عميل OpenAI الخاص بها"""
+    # كل طلب يعمل في حلقة أحداث مستقلة، لذا لا يصح مشاركة عميل HTTP بين الطلبات
+    orchestrator = Orchestrator(config)
+    try:
+        return await orchestrator.process_topic(topic)
+    finally:
+        await orchestrator.client.close()
+
+
 def process_topic_async(topic, respond, user_id):
     """معالجة الموضوع بشكل غير متزامن"""
     try:
         logger.info("بدء المعالجة غير المتزامنة للموضوع: %s", topic)
-        config = Config()
-        orchestrator = Orchestrator(config)
-        results = orchestrator.process_topic(topic)
+        results = asyncio.run(run_orchestrator(topic))
 
         if results:
             # تنسيق وإرسال النتائج
             blocks = format_response_blocks(results)
 
-            # حفظ النتائج في ملف
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"examples/slack_run_{user_id}_{timestamp}.json"
-            os.makedirs('examples', exist_ok=True)
-
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-
-            # إضافة معلومات الملف المحفوظ
-            blocks.append({
-                "type": "context",
-                "elements": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"📁 تم حفظ النتائج في: `{filename}`"
-                    }
-                ]
-            })
+            # حفظ النتائج في ملف عند تفعيله وإضافة معلومات الملف المحفوظ
+            if config.SAVE_SLACK_RESULTS:
+                path = save_results(results, user_id)
+                blocks.append({
+                    "type": "context",
+                    "elements": [
+                        {
+                            "type": "mrkdwn",
+                            "text": f"📁 تم حفظ النتائج في: `{path}`"
+                        }
+                    ]
+                })
 
             respond({
                 "response_type": "in_channel",
@@ -87,12 +123,59 @@ def process_topic_async(topic, respond, user_id):
             })
             logger.error("فشل في معالجة الموضوع للمستخدم %s", user_id)
 
-    except (IOError, json.JSONDecodeError) as e:
+    except FatalOrchestratorError as e:
+        logger.error("توقفت المعالجة بسبب خطأ لا يمكن المتابعة بعده: %s", e)
+        respond({
+            "response_type": "ephemeral",
+            "text": FATAL_ERROR_TEXT
+        })
+    except IOError as e:
         logger.error("خطأ في المعالجة غير المتزامنة: %s", e)
         respond({
             "response_type": "ephemeral",
             "text": f"❌ حدث خطأ غير متوقع: {str(e)}"
         })
+    except Exception:
+        # نتيجة المهمة لا يقرؤها أحد، لذا يُسجل أي خطأ آخر هنا ويُبلغ المستخدم
+        logger.exception("خطأ غير متوقع في معالجة الموضوع للمستخدم %s", user_id)
+        respond({
+            "response_type": "ephemeral",
+            "text": "❌ حدث خطأ أثناء معالجة الموضوع. يرجى المحاولة مرة أخرى."
+        })
+
+
+def process_mention_async(mention_text, say):
+    """معالجة الموضوع المذكور في الإشارة خارج خيط الأحداث"""
+    try:
+        results = asyncio.run(run_orchestrator(mention_text))
+        if results:
+            blocks = format_response_blocks(results)
+            say({"blocks": blocks})
+        else:
+            say({
+                "blocks": MENTION_FAILURE_BLOCKS
+            })
+    except FatalOrchestratorError as e:
+        logger.error("توقفت معالجة الإشارة بسبب خطأ لا يمكن المتابعة بعده: %s", e)
+        say({"text": FATAL_ERROR_TEXT})
+    except IOError as e:
+        logger.error("خطأ في معالجة الإشارة: %s", e)
+        say({
+            "blocks": [
+                {
+                    "type": "section",
+                    "text": {
+                        "type": "mrkdwn",
+                        "text": f"❌ *حدث خطأ:* {str(e)}"
+                    }
+                }
+            ]
+        })
+    except Exception:
+        # نتيجة المهمة لا يقرؤها أحد، لذا يُسجل أي خطأ آخر هنا ويُبلغ المستخدم
+        logger.exception("خطأ غير متوقع في معالجة الإشارة")
+        say({"blocks": MENTION_FAILURE_BLOCKS})
+
 
 # تهيئة Bolt App
 app = App(
@@ -101,13 +184,131 @@ app = App(
 )
 
 
+# كلمات طلب المساعدة في الأمر والإشارة
+HELP_KEYWORDS = frozenset({'help', 'مساعدة', '?'})
+MENTION_HELP_KEYWORDS = frozenset({'help', 'مساعدة'})
+
+# كتل Slack الثابتة تُبنى مرة واحدة وتُعاد في كل طلب
+EMPTY_TOPIC_BLOCKS = [
+    {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "⚠️ *يرجى إدخال موضوع بعد الأمر*\n\n*مثال:*\n"
+            "`/orchestrate تطوير تطبيق جوال للتجارة الإلكترونية`\n\n"
+            "*أو للحصول على المساعدة:*\n`/orchestrate help`"
+        }
+    }
+]
+
+HELP_BLOCKS = [
+    {
+        "type": "header",
+        "text": {
+            "type": "plain_text",
+            "text": "🤖 AI Orchestrator - دليل الاستخدام"
+        }
+    },
+    {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "*الأوامر المتاحة:*\n"
+            "• `/orchestrate موضوع المشروع` - لتحليل ومعالجة موضوع\n"
+            "• `/orchestrate help` - لعرض هذه المساعدة\n"
+            "• `@AI Orchestrator موضوع` - للتفاعل المباشر\n\n"
+            "*أمثلة:*\n"
+            "• `/orchestrate تطوير منصة تعليمية تفاعلية`\n"
+            "• `/orchestrate إنشاء متجر إلكتروني متكامل`\n"
+            "• `/orchestrate تصميم تطبيق إدارة المهام`"
+        }
+    },
+    {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "*المراحل التي يغطيها التحليل:*\n"
+            "1️⃣ توليد الأفكار (Ideation)\n"
+            "2️⃣ البحث (Research)\n"
+            "3️⃣ التصميم (Design)\n"
+            "4️⃣ خطة التطوير (Development Plan)\n"
+            "5️⃣ التنفيذ (Execution)\n"
+            "6️⃣ المراجعة والتحسين (Review & Optimize)"
+        }
+    }
+]
+
+MENTION_HELP_BLOCKS = [
+    {
+        "type": "header",
+        "text": {
+            "type": "plain_text",
+            "text": "🤖 AI Orchestrator Bot"
+        }
+    },
+    {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "👋 *مرحباً! أنا AI Orchestrator Bot*\n\n"
+            "*كيفية الاستخدام:*\n"
+            "• `/orchestrate موضوع المشروع` - لتحليل ومعالجة موضوع\n"
+            "• `@AI Orchestrator موضوع` - للتفاعل المباشر\n"
+            "• `@AI Orchestrator help` - لعرض هذه المساعدة\n\n"
+            "*مثال:*\n"
+            "`/orchestrate تطوير منصة تعليمية تفاعلية`"
+        }
+    }
+]
+
+MENTION_FAILURE_BLOCKS = [
+    {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "❌ *حدث خطأ أثناء المعالجة*\n"
+            "يرجى المحاولة مرة أخرى أو التحقق من السجلات."
+        }
+    }
+]
+
+# رسالة أخطاء الإعدادات كالمفتاح أو النموذج، فإعادة المحاولة لا تفيد قبل إصلاحها
+FATAL_ERROR_TEXT = ("❌ تعذر الاتصال بنموذج الذكاء الاصطناعي بسبب خطأ في الإعدادات. "
+                    "يرجى إبلاغ المسؤول.")
+
+DIVIDER_BLOCK = {"type": "divider"}
+
+NO_RESULTS_BLOCK = {
+    "type": "section",
+    "text": {
+        "type": "mrkdwn",
+        "text": "⚠️ *لا توجد نتائج لعرضها*"
+    }
+}
+
+# حد نص المرحلة المعروض، أقل بكثير من حد Slack لنص الكتلة (3000 حرف)
+MAX_PHASE_TEXT_LENGTH = 1000
+
+
+def phase_blocks(title, text):
+    """كتل Slack لمرحلة واحدة: عنوان ثم نص ثم فاصل"""
+    return (
+        {"type": "header", "text": {"type": "plain_text", "text": title}},
+        {"type": "section", "text": {"type": "mrkdwn", "text": text}},
+        DIVIDER_BLOCK
+    )
+
+
 def format_response_blocks(results):
     """تنسيق النتائج لعرضها في Slack"""
-    blocks = []
+    phases = results.get('phases')
+    if not phases:
+        # قائمة جديدة لأن المستدعي قد يضيف إليها كتلاً أخرى
+        return [NO_RESULTS_BLOCK]
 
     # معلومات عامة
     metadata = results.get('metadata', {})
-    blocks.extend([
+    blocks = [
         {
             "type": "header",
             "text": {
@@ -122,60 +323,24 @@ def format_response_blocks(results):
                 "text": f"📊 *معدل النجاح:* {metadata.get('success_rate', 'غير محدد')}\n⏰ *وقت المعالجة:* {metadata.get('timestamp', 'غير محدد')}"
             }
         },
-        {"type": "divider"}
-    ])
+        DIVIDER_BLOCK
+    ]
 
     # النتائج لكل مرحلة
-    phases = results.get('phases', {})
-    config = Config()
-    orchestrator = Orchestrator(config)
-    for phase_code, phase_name in orchestrator.phases:
+    extend = blocks.extend
+    for phase_code, phase_name in Orchestrator.phases:
         phase_data = phases.get(phase_code, {})
 
         if phase_data.get('status') == 'success':
             # مرحلة ناجحة
-            response_text = phase_data.get('response', 'لا توجد استجابة')
-            # تقصير النص إذا كان طويلاً
-            if len(response_text) > 1000:
-                response_text = response_text[:1000] + "..."
-
-            blocks.extend([
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": f"✅ {phase_code} - {phase_name}"
-                    }
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": response_text
-                    }
-                }
-            ])
+            response_text = truncate_text(
+                phase_data.get('response', 'لا توجد استجابة'), MAX_PHASE_TEXT_LENGTH)
+            extend(phase_blocks(f"✅ {phase_code} - {phase_name}", response_text))
         else:
             # مرحلة فاشلة
-            error_msg = phase_data.get('error', 'خطأ غير محدد')
-            blocks.extend([
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": f"❌ {phase_code} - {phase_name}"
-                    }
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"*خطأ:* {error_msg}"
-                    }
-                }
-            ])
-
-        blocks.append({"type": "divider"})
+            error_msg = truncate_text(
+                phase_data.get('error', 'خطأ غير محدد'), MAX_PHASE_TEXT_LENGTH)
+            extend(phase_blocks(f"❌ {phase_code} - {phase_name}", f"*خطأ:* {error_msg}"))
 
     return blocks
 
@@ -188,67 +353,23 @@ def handle_orchestrate(ack, respond, command):
     ack()
 
     topic = command.get('text', '').strip()
-    user_id = command.get('user_id')
+    # Slack يرسل user_id دائماً مع أوامر Slash
+    user_id = command['user_id']
 
     logger.info("تم استلام أمر /orchestrate من المستخدم %s للموضوع: %s", user_id, topic)
 
     if not topic:
         respond({
             "response_type": "ephemeral",
-            "blocks": [
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "⚠️ *يرجى إدخال موضوع بعد الأمر*\n\n*مثال:*\n"
-                        "`/orchestrate تطوير تطبيق جوال للتجارة الإلكترونية`\n\n"
-                        "*أو للحصول على المساعدة:*\n`/orchestrate help`"
-                    }
-                }
-            ]
+            "blocks": EMPTY_TOPIC_BLOCKS
         })
         return
 
     # التحقق من طلب المساعدة
-    if topic.lower() in ['help', 'مساعدة', '?']:
+    if topic.lower() in HELP_KEYWORDS:
         respond({
             "response_type": "ephemeral",
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "🤖 AI Orchestrator - دليل الاستخدام"
-                    }
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "*الأوامر المتاحة:*\n"
-                        "• `/orchestrate موضوع المشروع` - لتحليل ومعالجة موضوع\n"
-                        "• `/orchestrate help` - لعرض هذه المساعدة\n"
-                        "• `@AI Orchestrator موضوع` - للتفاعل المباشر\n\n"
-                        "*أمثلة:*\n"
-                        "• `/orchestrate تطوير منصة تعليمية تفاعلية`\n"
-                        "• `/orchestrate إنشاء متجر إلكتروني متكامل`\n"
-                        "• `/orchestrate تصميم تطبيق إدارة المهام`"
-                    }
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "*المراحل التي يغطيها التحليل:*\n"
-                        "1️⃣ توليد الأفكار (Ideation)\n"
-                        "2️⃣ البحث (Research)\n"
-                        "3️⃣ التصميم (Design)\n"
-                        "4️⃣ خطة التطوير (Development Plan)\n"
-                        "5️⃣ التنفيذ (Execution)\n"
-                        "6️⃣ المراجعة والتحسين (Review & Optimize)"
-                    }
-                }
-            ]
+            "blocks": HELP_BLOCKS
         })
         return
 
@@ -267,13 +388,8 @@ def handle_orchestrate(ack, respond, command):
         ]
     })
 
-    # تشغيل المعالجة في thread منفصل لتجنب timeout
-    thread = threading.Thread(
-        target=process_topic_async,
-        args=(topic, respond, user_id)
-    )
-    thread.daemon = True
-    thread.start()
+    # تشغيل المعالجة في خيط من المجمع لتجنب timeout
+    executor.submit(process_topic_async, topic, respond, user_id)
 
 # Listener للإشارات (@mention)
 @app.event("app_mention")
@@ -282,32 +398,12 @@ def handle_mention(event, say):
     text = event.get('text', '').strip()
 
     # إزالة إشارة البوت من النص
-    mention_text = text.split('>', 1)[-1].strip() if '>' in text else text
+    _, separator, tail = text.partition('>')
+    mention_text = tail.strip() if separator else text
 
-    if not mention_text or mention_text.lower() in ['help', 'مساعدة']:
+    if not mention_text or mention_text.lower() in MENTION_HELP_KEYWORDS:
         say({
-            "blocks": [
-                {
-                    "type": "header",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "🤖 AI Orchestrator Bot"
-                    }
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "👋 *مرحباً! أنا AI Orchestrator Bot*\n\n"
-                        "*كيفية الاستخدام:*\n"
-                        "• `/orchestrate موضوع المشروع` - لتحليل ومعالجة موضوع\n"
-                        "• `@AI Orchestrator موضوع` - للتفاعل المباشر\n"
-                        "• `@AI Orchestrator help` - لعرض هذه المساعدة\n\n"
-                        "*مثال:*\n"
-                        "`/orchestrate تطوير منصة تعليمية تفاعلية`"
-                    }
-                }
-            ]
+            "blocks": MENTION_HELP_BLOCKS
         })
     else:
         # معالجة الموضوع المذكور
@@ -323,39 +419,9 @@ def handle_mention(event, say):
             ]
         })
 
-        try:
-            config = Config()
-            orchestrator = Orchestrator(config)
-            results = orchestrator.process_topic(mention_text)
-            if results:
-                blocks = format_response_blocks(results)
-                say({"blocks": blocks})
-            else:
-                say({
-                    "blocks": [
-                        {
-                            "type": "section",
-                            "text": {
-                                "type": "mrkdwn",
-                                "text": "❌ *حدث خطأ أثناء المعالجة*\n"
-                                "يرجى المحاولة مرة أخرى أو التحقق من السجلات."
-                            }
-                        }
-                    ]
-                })
-        except (IOError, json.JSONDecodeError) as e:
-            logger.error("خطأ في معالجة الإشارة: %s", e)
-            say({
-                "blocks": [
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"❌ *حدث خطأ:* {str(e)}"
-                        }
-                    }
-                ]
-            })
+        # المعالجة تتم في خيط من المجمع حتى لا تتأخر أحداث Slack الأخرى
+        executor.submit(process_mention_async, mention_text, say)
+
 
 # معالج الأخطاء العامة
 
@@ -389,7 +455,7 @@ def main():
             app.start(port=int(os.environ.get('PORT', 3000)))
     except KeyboardInterrupt:
         logger.info("تم إيقاف البوت بواسطة المستخدم")
-    except (IOError, json.JSONDecodeError) as e:
+    except IOError as e:
         logger.error("خطأ في تشغيل البوت: %s", e)
         sys.exit(1)
 
@@ -0,0 +1,7 @@
+-- Composite indexes backing keyset pagination on the list endpoints
+
+CREATE INDEX IF NOT EXISTS idx_projects_org_created_at_id
+    ON projects(organization_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_orchestration_templates_usage_created_at_id
+    ON orchestration_templates(usage_count DESC, created_at DESC, id DESC);
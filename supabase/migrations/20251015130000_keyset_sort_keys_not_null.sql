@@ -0,0 +1,11 @@
+-- Keyset pagination compares (sort key, id) tuples, which never match a NULL
+-- sort key; backfill the defaults and forbid NULLs on the cursor columns
+
+UPDATE projects SET created_at = NOW() WHERE created_at IS NULL;
+ALTER TABLE projects ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE orchestration_templates SET usage_count = 0 WHERE usage_count IS NULL;
+UPDATE orchestration_templates SET created_at = NOW() WHERE created_at IS NULL;
+ALTER TABLE orchestration_templates
+    ALTER COLUMN usage_count SET NOT NULL,
+    ALTER COLUMN created_at SET NOT NULL;
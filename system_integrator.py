@@ -2,31 +2,112 @@
 نظام التكامل المباشر للذكاء الاصطناعي
 يمنح نموذج GPT القدرة على التعديل المباشر في الأنظمة
 """
-import json
 import logging
 import os
+import re
+import shlex
+import shutil
 import subprocess
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Set
 
-import requests
+import httpx
+import orjson
+
+from utils import queued_handler
 
 logger = logging.getLogger(__name__)
 
+# الحد الأقصى لاستدعاءات API المتزامنة داخل دفعة واحدة
+MAX_CONCURRENT_API_CALLS = 8
+
+# مهلة استدعاءات API الخارجية بالثواني
+API_CALL_TIMEOUT = 10
+
+# عدد ملخصات العمليات المحفوظة في الذاكرة؛ السجل الكامل في الملف
+MAX_EXECUTION_LOG_ENTRIES = 10_000
+
+# سجل JSONL يحتفظ بالطلبات والنتائج كاملة
+INTEGRATION_LOG_FILE = 'logs/ai_integrations.log'
+
+# ملف متغيرات البيئة الذي تعدله عمليات environment_variables
+ENV_FILE = '.env'
+
+# أسماء الحزم والفروع القادمة من النموذج؛ لا تبدأ بـ "-" حتى لا تُقرأ كخيارات لـ pip أو git
+PACKAGE_NAME_PATTERN = re.compile(
+    r'^[A-Za-z0-9][A-Za-z0-9._-]*(\[[A-Za-z0-9._,-]+\])?'
+    r'([<>=!~]=?[A-Za-z0-9.*+!]+(,[<>=!~]=?[A-Za-z0-9.*+!]+)*)?$')
+BRANCH_NAME_PATTERN = re.compile(r'^(?!.*\.\.)[A-Za-z0-9][A-Za-z0-9._/-]*$')
+
+# يكتب سطور JSONL في ملف السجل فقط دون المرور بمعالجات التسجيل العامة
+execution_logger = logging.getLogger(f'{__name__}.executions')
+execution_logger.propagate = False
+_execution_handler = None
+_execution_logger_lock = threading.Lock()
+
+
+def get_execution_logger() -> logging.Logger:
+    """إعداد سجل العمليات عند أول استخدام مع الكتابة من خيط خلفي"""
+    global _execution_handler
+    with _execution_logger_lock:
+        # علم خاص بدلاً من فحص handlers لأن أدوات أخرى قد تضيف معالجاتها للسجل
+        if _execution_handler is None:
+            os.makedirs(os.path.dirname(INTEGRATION_LOG_FILE), exist_ok=True)
+            _execution_handler = queued_handler(
+                logging.FileHandler(INTEGRATION_LOG_FILE, encoding='utf-8', delay=True))
+            execution_logger.addHandler(_execution_handler)
+            execution_logger.setLevel(logging.INFO)
+    return execution_logger
+
+
+def create_http_client() -> httpx.Client:
+    """إنشاء عميل HTTP لاستدعاءات API يمكن مشاركته بين عدة مكاملات"""
+    return httpx.Client(
+        http2=True,
+        # اتباع التحويلات كما كانت تفعل requests بدلاً من إرجاع استجابة 3xx
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=MAX_CONCURRENT_API_CALLS)
+    )
+
+
+def _check_name(value: str, pattern: re.Pattern, kind: str):
+    """رفض الأسماء التي قد تُفسر كخيارات أو مسارات بدلاً من اسم صريح"""
+    if not isinstance(value, str) or not pattern.match(value):
+        raise ValueError(f'اسم {kind} غير صالح: {value!r}')
+
 
 class SystemIntegrator:
     """فئة التكامل المباشر مع الأنظمة"""
 
-    def __init__(self, config):
+    def __init__(self, config, http_client: Optional[httpx.Client] = None):
         self.config = config
         self.enabled_integrations = self._load_enabled_integrations()
-        self.execution_log = []
+        self.execution_log = deque(maxlen=MAX_EXECUTION_LOG_ENTRIES)
+        # جدول التوجيه يُبنى مرة واحدة بدلاً من كل طلب
+        self._handlers = {
+            'file_system': self._handle_file_operations,
+            'git_operations': self._handle_git_operations,
+            'package_management': self._handle_package_operations,
+            'database_operations': self._handle_database_operations,
+            'api_calls': self._handle_api_calls,
+            'deployment': self._handle_deployment,
+            'system_commands': self._handle_system_commands,
+            'environment_variables': self._handle_env_operations
+        }
+        # يمكن تمرير عميل HTTP مشترك مع بقية التطبيق، ولا يُغلق إلا ما أنشأناه
+        self._http_client = http_client
+        self._owns_http_client = http_client is None
+        self._http_client_lock = threading.Lock()
 
     # --- Public Methods ---
 
     def execute_ai_request(self, request_type: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """تنفيذ طلب من الذكاء الاصطناعي"""
-        if not self.enabled_integrations.get(request_type, False):
+        if request_type not in self.enabled_integrations:
             return {
                 'success': False,
                 'error': f'التكامل {request_type} غير مفعل',
@@ -37,44 +118,89 @@ class SystemIntegrator:
             result = self._route_request(request_type, parameters)
             self._log_execution(request_type, parameters, result)
             return result
-        except (IOError, ValueError) as e:
+        except (IOError, ValueError, subprocess.CalledProcessError) as e:
             error_result = {
                 'success': False,
-                'error': str(e),
+                # مخرجات الأخطاء من الأمر الفاشل أوضح من رسالة الاستثناء
+                'error': getattr(e, 'stderr', None) or str(e),
                 'timestamp': datetime.now().isoformat()
             }
             self._log_execution(request_type, parameters, error_result)
             return error_result
 
+    def execute_batch(self, request_type: str,
+                      params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """تنفيذ مجموعة طلبات من نفس النوع مع الحفاظ على ترتيب النتائج"""
+        if len(params_list) > 1 and request_type in self.enabled_integrations:
+            # تثبيت جميع الحزم في استدعاء pip واحد
+            if request_type == 'package_management' and all(
+                    params.get('operation') == 'install' for params in params_list):
+                return self._execute_install_batch(params_list)
+
+            # استدعاءات API مستقلة، لذا تُنفذ بالتوازي
+            if request_type == 'api_calls':
+                workers = min(len(params_list), MAX_CONCURRENT_API_CALLS)
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    return list(executor.map(
+                        lambda params: self.execute_ai_request(request_type, params),
+                        params_list))
+
+        return [self.execute_ai_request(request_type, params) for params in params_list]
+
     def get_execution_history(self) -> List[Dict[str, Any]]:
         """الحصول على تاريخ التنفيذ"""
-        return self.execution_log
+        return list(self.execution_log)
 
     def enable_integration(self, integration_type: str):
         """تفعيل تكامل معين"""
-        self.enabled_integrations[integration_type] = True
+        self.enabled_integrations.add(integration_type)
 
     def disable_integration(self, integration_type: str):
         """إلغاء تفعيل تكامل معين"""
-        self.enabled_integrations[integration_type] = False
+        self.enabled_integrations.discard(integration_type)
+
+    def close(self):
+        """إغلاق اتصالات HTTP المفتوحة"""
+        if self._owns_http_client and self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+
+    def __enter__(self):
+        """استخدام المكامل داخل with لإغلاق اتصالاته تلقائياً"""
+        return self
+
+    def __exit__(self, *exc_info):
+        """إغلاق الاتصالات عند الخروج من with"""
+        self.close()
 
     # --- Private Methods ---
 
+    def _get_http_client(self) -> httpx.Client:
+        """عميل HTTP مشترك يعيد استخدام الاتصالات بين استدعاءات API"""
+        # القفل يمنع إنشاء أكثر من عميل عند التنفيذ المتوازي داخل الدفعة
+        with self._http_client_lock:
+            if self._http_client is None:
+                self._http_client = create_http_client()
+        return self._http_client
+
+    def _execute_install_batch(self, params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """تنفيذ دفعة من طلبات تثبيت الحزم"""
+        try:
+            results = self._install_packages([params['package'] for params in params_list])
+        except (IOError, ValueError, subprocess.CalledProcessError) as e:
+            # فشل حزمة واحدة يُفشل الاستدعاء كله، لذا تُثبت كل حزمة منفردة لمعرفة نتيجتها
+            logger.warning("فشل تثبيت الدفعة، إعادة المحاولة لكل حزمة: %s", e)
+            return [self.execute_ai_request('package_management', params)
+                    for params in params_list]
+
+        for params, result in zip(params_list, results):
+            self._log_execution('package_management', params, result)
+        return results
+
     def _route_request(self, request_type: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """توجيه الطلب للمعالج المناسب"""
-        handlers = {
-            'file_system': self._handle_file_operations,
-            'git_operations': self._handle_git_operations,
-            'package_management': self._handle_package_operations,
-            'database_operations': self._handle_database_operations,
-            'api_calls': self._handle_api_calls,
-            'deployment': self._handle_deployment,
-            'system_commands': self._handle_system_commands,
-            'environment_variables': self._handle_env_operations
-        }
-
-        handler = handlers.get(request_type)
-        if not handler:
+        handler = self._handlers.get(request_type)
+        if handler is None:
             raise ValueError(f'معالج غير معروف: {request_type}')
 
         return handler(parameters)
@@ -95,6 +221,18 @@ class SystemIntegrator:
             return self._create_directory(params['path'])
         raise ValueError(f'عملية ملف غير معروفة: {operation}')
 
+    def _handle_git_operations(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """معالجة عمليات Git"""
+        operation = params.get('operation')
+
+        if operation == 'commit':
+            return self._git_commit(params['message'])
+        if operation == 'push':
+            return self._git_push(params['branch'])
+        if operation == 'create_branch':
+            return self._git_create_branch(params['branch'])
+        raise ValueError(f'عملية Git غير معروفة: {operation}')
+
     def _handle_package_operations(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """معالجة عمليات الحزم"""
         operation = params.get('operation')
@@ -126,8 +264,11 @@ class SystemIntegrator:
         headers = params.get('headers', {})
         data = params.get('data')
 
-        response = requests.request(
-            method, url, headers=headers, json=data, timeout=10)
+        try:
+            response = self._get_http_client().request(
+                method, url, headers=headers, json=data, timeout=API_CALL_TIMEOUT)
+        except httpx.HTTPError as e:
+            raise IOError(f'فشل في استدعاء {url}: {e}') from e
 
         return {
             'success': True,
@@ -154,10 +295,13 @@ class SystemIntegrator:
         """معالجة أوامر النظام"""
         command = params['command']
         working_dir = params.get('working_dir', '.')
+        # الأمر النصي يُقسم إلى معاملات حتى لا يمر أي أمر عبر shell
+        if isinstance(command, str):
+            command = shlex.split(command)
 
         result = subprocess.run(
             command,
-            shell=True,
+            shell=False,
             cwd=working_dir,
             capture_output=True,
             text=True,
@@ -233,10 +377,13 @@ class SystemIntegrator:
             with open(path, 'r', encoding='utf-8') as f:
                 content = f.read()
 
-            # تطبيق التغييرات
-            if 'replace' in changes:
-                for old, new in changes['replace'].items():
-                    content = content.replace(old, new)
+            # تطبيق جميع الاستبدالات في مرور واحد على المحتوى
+            replacements = changes.get('replace') or {}
+            # الأطول أولاً حتى لا يطابق نص قصير بداية نص أطول منه
+            targets = [re.escape(old) for old in sorted(replacements, key=len, reverse=True) if old]
+            if targets:
+                content = re.compile('|'.join(targets)).sub(
+                    lambda match: replacements[match.group(0)], content)
 
             if 'append' in changes:
                 content += changes['append']
@@ -259,42 +406,55 @@ class SystemIntegrator:
 
     def _git_commit(self, message: str) -> Dict[str, Any]:
         """تنفيذ git commit"""
-        return self._handle_system_commands({'command': f'git commit -m "{message}"'})
+        return self._handle_system_commands({'command': ['git', 'commit', '-m', message]})
 
     def _git_push(self, branch: str) -> Dict[str, Any]:
         """تنفيذ git push"""
-        return self._handle_system_commands({'command': f'git push origin {branch}'})
+        _check_name(branch, BRANCH_NAME_PATTERN, 'فرع')
+        return self._handle_system_commands(
+            {'command': ['git', 'push', 'origin', '--', branch]})
 
     def _git_create_branch(self, branch_name: str) -> Dict[str, Any]:
         """إنشاء فرع جديد"""
-        return self._handle_system_commands({'command': f'git checkout -b {branch_name}'})
+        _check_name(branch_name, BRANCH_NAME_PATTERN, 'فرع')
+        return self._handle_system_commands({'command': ['git', 'checkout', '-b', branch_name]})
 
     # --- Package Management Operations ---
 
     def _install_package(self, package: str) -> Dict[str, Any]:
         """تثبيت حزمة"""
+        return self._install_packages([package])[0]
+
+    def _install_packages(self, packages: List[str]) -> List[Dict[str, Any]]:
+        """تثبيت عدة حزم في استدعاء pip واحد مع نتيجة لكل حزمة"""
+        for package in packages:
+            _check_name(package, PACKAGE_NAME_PATTERN, 'حزمة')
         result = subprocess.run(
-            ['pip', 'install', package],
+            ['pip', 'install', '--', *packages],
             capture_output=True,
             text=True,
             check=True
         )
 
-        return {
+        timestamp = datetime.now().isoformat()
+        return [{
             'success': result.returncode == 0,
             'message': f'تثبيت الحزمة: {package}',
             'output': result.stdout,
             'error': result.stderr,
-            'timestamp': datetime.now().isoformat()
-        }
+            'timestamp': timestamp
+        } for package in packages]
 
     def _uninstall_package(self, package: str) -> Dict[str, Any]:
         """إلغاء تثبيت حزمة"""
-        return self._handle_system_commands({'command': f'pip uninstall -y {package}'})
+        _check_name(package, PACKAGE_NAME_PATTERN, 'حزمة')
+        return self._handle_system_commands(
+            {'command': ['pip', 'uninstall', '-y', '--', package]})
 
     def _update_packages(self) -> Dict[str, Any]:
         """تحديث الحزم"""
-        return self._handle_system_commands({'command': 'pip install --upgrade -r requirements.txt'})
+        return self._handle_system_commands({
+            'command': ['pip', 'install', '--upgrade', '-r', 'requirements.txt']})
 
     # --- Database Operations ---
 
@@ -362,25 +522,7 @@ class SystemIntegrator:
 
     def _set_env_variable(self, key: str, value: str) -> Dict[str, Any]:
         """تعيين متغير بيئة"""
-        env_file = '.env'
-
-        # قراءة الملف الحالي
-        env_vars = {}
-        if os.path.exists(env_file):
-            with open(env_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if '=' in line and not line.startswith('#'):
-                        k, v = line.strip().split('=', 1)
-                        env_vars[k] = v
-
-        # تحديث المتغير
-        env_vars[key] = value
-
-        # كتابة الملف
-        with open(env_file, 'w', encoding='utf-8') as f:
-            for k, v in env_vars.items():
-                f.write(f'{k}={v}\n')
-
+        self._update_env_file(key, value)
         return {
             'success': True,
             'message': f'تم تعيين متغير البيئة: {key}',
@@ -399,14 +541,7 @@ class SystemIntegrator:
 
     def _delete_env_variable(self, key: str) -> Dict[str, Any]:
         """حذف متغير بيئة"""
-        env_file = '.env'
-        if os.path.exists(env_file):
-            with open(env_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            with open(env_file, 'w', encoding='utf-8') as f:
-                for line in lines:
-                    if not line.startswith(f'{key}='):
-                        f.write(line)
+        self._update_env_file(key)
         return {
             'success': True,
             'message': f'تم حذف متغير البيئة: {key}',
@@ -415,45 +550,79 @@ class SystemIntegrator:
 
     # --- Helper Methods ---
 
-    def _load_enabled_integrations(self) -> Dict[str, bool]:
+    def _update_env_file(self, key: str, value: Optional[str] = None):
+        """تعيين سطر متغير واحد في .env أو حذفه مع الحفاظ على التعليقات والترتيب"""
+        # الكتابة تتم على الملف الهدف حتى لا يُستبدل رابط رمزي بملف عادي
+        env_file = os.path.realpath(ENV_FILE)
+        lines = []
+        if os.path.exists(env_file):
+            with open(env_file, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+
+        new_line = None if value is None else f'{key}={value}\n'
+        updated = []
+        found = False
+        for line in lines:
+            if line.lstrip().startswith('#') or line.split('=', 1)[0].strip() != key:
+                updated.append(line)
+                continue
+            # أول سطر للمتغير يُستبدل وأي تكرار بعده يُحذف
+            if new_line is not None and not found:
+                updated.append(new_line)
+            found = True
+
+        if new_line is not None and not found:
+            if updated and not updated[-1].endswith('\n'):
+                updated[-1] += '\n'
+            updated.append(new_line)
+
+        if updated == lines:
+            return
+
+        # الكتابة في ملف مؤقت فريد بجوار الهدف وبصلاحياته نفسها ثم الاستبدال
+        # حتى لا يُقرأ ملف نصف مكتوب ولا يتصادم كاتبان
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(env_file), prefix='.env.')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.writelines(updated)
+            if os.path.exists(env_file):
+                shutil.copymode(env_file, temp_file)
+            os.replace(temp_file, env_file)
+        except OSError:
+            os.unlink(temp_file)
+            raise
+
+    def _load_enabled_integrations(self) -> Set[str]:
         """تحميل التكاملات المفعلة"""
         return {
-            'file_system': True,
-            'git_operations': True,
-            'package_management': True,
-            'database_operations': True,
-            'api_calls': True,
-            'deployment': True,
-            'system_commands': True,
-            'environment_variables': True
+            'file_system',
+            'git_operations',
+            'package_management',
+            'database_operations',
+            'api_calls',
+            'deployment',
+            'system_commands',
+            'environment_variables'
         }
 
     def _log_execution(self, request_type: str, parameters: Dict[str, Any], result: Dict[str, Any]):
         """تسجيل العملية المنفذة"""
+        # المعالجات تضع توقيتها في النتيجة، فلا حاجة لقراءة الساعة مرة أخرى
+        timestamp = result.get('timestamp') or datetime.now().isoformat()
+
+        # الذاكرة تحتفظ بملخص فقط؛ المعاملات والنتائج الكاملة في ملف السجل
+        self.execution_log.append({
+            'timestamp': timestamp,
+            'request_type': request_type,
+            'success': result.get('success', False)
+        })
+
+        # حفظ في ملف السجل
         log_entry = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': timestamp,
             'request_type': request_type,
             'parameters': parameters,
             'result': result
         }
-
-        self.execution_log.append(log_entry)
-
-        # حفظ في ملف السجل
-        log_file = 'logs/ai_integrations.log'
-        os.makedirs('logs', exist_ok=True)
-
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + '\n')
-
-    def get_execution_history(self) -> List[Dict[str, Any]]:
-        """الحصول على تاريخ التنفيذ"""
-        return self.execution_log
-
-    def enable_integration(self, integration_type: str):
-        """تفعيل تكامل معين"""
-        self.enabled_integrations[integration_type] = True
-
-    def disable_integration(self, integration_type: str):
-        """إلغاء تفعيل تكامل معين"""
-        self.enabled_integrations[integration_type] = False
\ No newline at end of file
+        get_execution_logger().info(
+            orjson.dumps(log_entry, option=orjson.OPT_NON_STR_KEYS).decode())
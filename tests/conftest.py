@@ -1,10 +1,13 @@
+import os
+
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
 @pytest.fixture
 def mock_openai_client():
     """Mock the OpenAI client."""
     mock_client = MagicMock()
+    mock_client.chat.completions.create = AsyncMock()
     mock_client.chat.completions.create.return_value = MagicMock(
         choices=[
             MagicMock(message=MagicMock(content="Test response from AI"))
@@ -15,4 +18,39 @@ def mock_openai_client():
 @pytest.fixture(autouse=True)
 def patch_openai(monkeypatch, mock_openai_client):
     """Patch the OpenAI client."""
-    monkeypatch.setattr("base_orchestrator.OpenAI", lambda api_key: mock_openai_client)
+    monkeypatch.setattr("base_orchestrator.AsyncOpenAI", lambda api_key, **kwargs: mock_openai_client)
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """Isolate tests from the shared model response and prompt caches."""
+    from base_orchestrator import BaseOrchestrator
+    BaseOrchestrator._response_cache.clear()
+    BaseOrchestrator._phase_prompt_cache.clear()
+    yield
+    BaseOrchestrator._response_cache.clear()
+    BaseOrchestrator._phase_prompt_cache.clear()
+
+@pytest.fixture(autouse=True)
+def isolate_log_files(tmp_path, monkeypatch):
+    """Write the run and integration logs under tmp_path instead of the repo."""
+    import enhanced_orchestrator
+    import orchestrator
+    import system_integrator
+
+    monkeypatch.setattr(system_integrator, "INTEGRATION_LOG_FILE",
+                        str(tmp_path / "logs" / "ai_integrations.log"))
+    monkeypatch.setattr(system_integrator, "_execution_handler", None)
+
+    file_handlers = (orchestrator.log_file_handler, enhanced_orchestrator.log_file_handler)
+    for handler in file_handlers:
+        # The handlers reopen their file lazily on the next record
+        with handler.lock:
+            handler.close()
+            monkeypatch.setattr(handler, "baseFilename",
+                                str(tmp_path / os.path.basename(handler.baseFilename)))
+    yield
+    for handler in file_handlers:
+        with handler.lock:
+            handler.close()
+    if system_integrator._execution_handler is not None:
+        system_integrator.execution_logger.removeHandler(system_integrator._execution_handler)
@@ -0,0 +1,159 @@
+"""
+Test suite for the REST API
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from api.main import APP as app
+
+# Test client
+client = TestClient(app)
+
+
+class TestAPI:
+    """Test cases for API endpoints"""
+    
+    def test_health_check(self):
+        """Test health check endpoint"""
+        response = client.get("/health")
+        assert response.status_code == 200
+        assert "status" in response.json()
+        assert response.json()["status"] == "healthy"
+    
+    def test_keyset_pagination(self):
+        """Test the next cursor encodes the sort key of the last returned row"""
+        from api.main import decode_cursor, paginate
+
+        rows = [
+            {"id": uuid.uuid4(), "created_at": datetime(2025, 1, day)}
+            for day in (3, 2, 1)
+        ]
+        page = paginate(rows, 2, ["created_at", "id"])
+
+        assert len(page["data"]) == 2
+        assert page["pagination"]["has_next"] is True
+        created_at, row_id = decode_cursor(
+            page["pagination"]["next_cursor"], datetime.fromisoformat, uuid.UUID)
+        assert created_at == rows[1]["created_at"]
+        assert row_id == rows[1]["id"]
+
+        last_page = paginate(rows[2:], 2, ["created_at", "id"])
+        assert last_page["pagination"]["next_cursor"] is None
+
+    def test_tampered_cursor_is_rejected(self):
+        """Test cursors that do not decode to the expected sort key are a 400"""
+        from api.main import decode_cursor, encode_cursor
+
+        bad_cursors = [
+            "not-base64!",
+            encode_cursor("2025-01-01T00:00:00"),
+            encode_cursor("yesterday", uuid.uuid4()),
+            encode_cursor("2025-01-01T00:00:00", "not-a-uuid"),
+        ]
+        for cursor in bad_cursors:
+            with pytest.raises(HTTPException) as exc_info:
+                decode_cursor(cursor, datetime.fromisoformat, uuid.UUID)
+            assert exc_info.value.status_code == 400
+
+        with pytest.raises(ValueError):
+            encode_cursor(None, uuid.uuid4())
+
+    def test_list_projects_tampered_cursor_returns_400(self):
+        """Test a tampered cursor on a list endpoint is a client error"""
+        from api.main import check_rate_limit, encode_cursor, get_current_user
+
+        app.dependency_overrides[get_current_user] = lambda: {"organization_id": uuid.uuid4()}
+        app.dependency_overrides[check_rate_limit] = lambda: True
+        try:
+            response = client.get("/api/v1/projects", params={
+                "cursor": encode_cursor("2025-01-01T00:00:00", "not-a-uuid")})
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+    def test_stream_ndjson(self):
+        """Test rows stream one per line followed by the pagination record"""
+        from unittest.mock import MagicMock
+        from api.main import decode_cursor, stream_ndjson
+
+        rows = [{"id": uuid.uuid4(), "created_at": datetime(2025, 1, day)} for day in (3, 2, 1)]
+        conn = MagicMock()
+        conn.cursor.return_value.__aiter__.return_value = rows
+
+        async def collect():
+            return [line async for line in stream_ndjson("SELECT", [], 2, ["created_at", "id"])]
+
+        with patch('api.main.db_pool') as mock_pool:
+            mock_pool.acquire.return_value.__aenter__.return_value = conn
+            lines = [json.loads(line) for line in asyncio.run(collect())]
+
+        assert [line["id"] for line in lines[:2]] == [str(row["id"]) for row in rows[:2]]
+        pagination = lines[-1]["pagination"]
+        assert pagination["has_next"] is True
+        assert decode_cursor(pagination["next_cursor"], str, uuid.UUID)[1] == rows[1]["id"]
+
+    def test_get_organization_cached(self):
+        """Test cached organizations are served without a database query"""
+        from api.main import get_organization
+
+        org_id = uuid.uuid4()
+        with patch('api.main.redis_client', new_callable=AsyncMock) as mock_redis, \
+                patch('api.main.db_pool') as mock_pool:
+            mock_redis.get.return_value = json.dumps({"id": str(org_id), "name": "Org"})
+
+            org = asyncio.run(get_organization({"organization_id": org_id}))
+
+        assert org == {"id": str(org_id), "name": "Org"}
+        mock_redis.get.assert_awaited_once_with(f"org:{org_id}")
+        mock_pool.acquire.assert_not_called()
+
+    @patch('api.main.get_current_user')
+    def test_create_project(self, mock_auth):
+        """Test project creation endpoint"""
+        mock_auth.return_value = {
+            "id": uuid.uuid4(),
+            "organization_id": uuid.uuid4(),
+            "email": "test@example.com"
+        }
+        
+        project_data = {
+            "name": "Test Project",
+            "description": "Test Description",
+            "topic": "Test topic for project",
+            "priority": "high"
+        }
+        
+        with patch('api.main.db_pool') as mock_pool:
+            mock_pool.acquire.return_value.__aenter__.return_value.fetchval.return_value = uuid.uuid4()
+            
+            response = client.post("/api/v1/projects", json=project_data)
+            # Note: This will fail without proper database setup, but tests the endpoint structure
+    
+    @patch('api.main.get_current_user')
+    def test_start_orchestration(self, mock_auth):
+        """Test orchestration start endpoint"""
+        mock_auth.return_value = {
+            "id": uuid.uuid4(),
+            "organization_id": uuid.uuid4(),
+            "email": "test@example.com"
+        }
+        
+        orchestration_data = {
+            "topic": "Test orchestration topic",
+            "integration_enabled": True
+        }
+        
+        with patch('api.main.db_pool') as mock_pool:
+            mock_pool.acquire.return_value.__aenter__.return_value.fetchval.return_value = uuid.uuid4()
+            
+            response = client.post("/api/v1/orchestrate", json=orchestration_data)
+            # Note: This will fail without proper database setup, but tests the endpoint structure
@@ -0,0 +1,43 @@
+"""
+Test suite for the Documentation Analysis Agent
+"""
+import asyncio
+from unittest.mock import patch
+
+
+class TestDocumentationAnalysisAgent:
+    """Test cases for Documentation Analysis Agent"""
+
+    def test_analyze_documentation_sections(self):
+        """Test Markdown and underlined headings split the document into sections"""
+        from documentation_analysis_agent import DocumentationAnalysisAgent
+
+        content = "# Title\nIntro\n\n## Install\npip install x\n\nUsage\n=====\nRun it\n"
+        result = DocumentationAnalysisAgent().analyze_documentation(content)
+
+        assert result['summary'] == content[:100]
+        assert result['sections'] == {
+            'Title': 'Intro',
+            'Install': 'pip install x',
+            'Usage': 'Run it'
+        }
+
+    def test_handle_message_batches_analyses(self):
+        """Test doc analyses are published in batches rather than per file"""
+        from data_creator_agent import ArchitectureEventType
+        from documentation_analysis_agent import DocumentationAnalysisAgent
+
+        agent = DocumentationAnalysisAgent(config={"batch_size": 2})
+        files = [{"file_path": f"doc{i}.md", "content": f"# Doc {i}\nBody"} for i in range(3)]
+        files.append({"file_path": "main.py", "content": "print()"})
+
+        with patch.object(agent, 'send') as mock_send:
+            asyncio.run(agent.handle_message({
+                "type": ArchitectureEventType.REPO_DATA_EXTRACTED,
+                "source_repo": "repo",
+                "data": files
+            }))
+
+        batches = [call.args[0]["analyses"] for call in mock_send.call_args_list]
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert batches[0][0]["source_file"] == "doc0.md"
@@ -0,0 +1,41 @@
+"""
+Test suite for the Embedding Agent
+"""
+import asyncio
+from unittest.mock import Mock, patch
+
+import pytest
+
+
+class TestEmbeddingAgent:
+    """Test cases for Embedding Agent"""
+
+    def test_handle_message_encodes_batch_once(self):
+        """Test a batched analysis message is embedded in a single encode call"""
+        from data_creator_agent import ArchitectureEventType
+        from embedding_agent import EmbeddingAgent
+
+        agent = EmbeddingAgent()
+        agent._model = Mock()
+        agent._model.encode.return_value.tolist.return_value = [[0.1, 0.2], [0.3, 0.4]]
+
+        with patch.object(agent, 'send') as mock_send:
+            asyncio.run(agent.handle_message({
+                "type": ArchitectureEventType.ANALYZED_DOCUMENTATION,
+                "repo": "repo",
+                "analyses": [{"source_file": f"doc{i}.md", "analysis": {"summary": str(i)}}
+                             for i in range(2)]
+            }))
+
+        agent._model.encode.assert_called_once()
+        messages = [call.args[0] for call in mock_send.call_args_list]
+        assert [m["original_payload"]["source_file"] for m in messages] == ["doc0.md", "doc1.md"]
+        assert messages[1]["embedding_vector"] == [0.3, 0.4]
+
+    def test_missing_dependency_raises_clear_error(self):
+        """Test a missing sentence-transformers install points at the extra requirements"""
+        from embedding_agent import EmbeddingAgent
+
+        with patch.dict('sys.modules', {'sentence_transformers': None}):
+            with pytest.raises(ImportError, match="requirements-embeddings.txt"):
+                EmbeddingAgent().generate_embeddings(["text"])
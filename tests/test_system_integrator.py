@@ -0,0 +1,193 @@
+"""
+Test suite for the System Integrator
+"""
+import subprocess
+from unittest.mock import Mock, patch
+
+import pytest
+
+from system_integrator import SystemIntegrator
+
+
+class TestSystemIntegrator:
+    """Test cases for System Integrator"""
+    
+    @pytest.fixture
+    def integrator(self):
+        """Create integrator instance for testing"""
+        from config import Config
+        return SystemIntegrator(Config())
+    
+    def test_file_system_operations(self, integrator, tmp_path):
+        """Test file system operations"""
+        # Test file creation
+        test_file = tmp_path / "test.txt"
+        result = integrator._create_file(str(test_file), "Test content")
+        
+        assert result['success'] is True
+        assert test_file.exists()
+        assert test_file.read_text() == "Test content"
+
+    def test_modify_file_replaces_in_one_pass(self, integrator, tmp_path):
+        """Test replacements apply to the original text, longest match first"""
+        test_file = tmp_path / "test.txt"
+        test_file.write_text("foo foobar baz")
+
+        result = integrator._modify_file(str(test_file), {
+            'replace': {'foo': 'X', 'foobar': 'Y', 'baz': 'foo'},
+            'append': '!'
+        })
+
+        assert result['success'] is True
+        assert test_file.read_text() == "X Y foo!"
+
+    def test_environment_variable_operations(self, integrator, tmp_path):
+        """Test environment variable operations"""
+        # Change to temp directory for testing
+        import os
+        original_cwd = os.getcwd()
+        os.chdir(tmp_path)
+        
+        try:
+            result = integrator._set_env_variable("TEST_VAR", "test_value")
+            assert result['success'] is True
+            
+            env_file = tmp_path / ".env"
+            assert env_file.exists()
+            assert "TEST_VAR=test_value" in env_file.read_text()
+        finally:
+            os.chdir(original_cwd)
+
+    def test_env_file_updates_keep_other_lines(self, integrator, tmp_path, monkeypatch):
+        """Test set/delete only touch the matching variable line"""
+        monkeypatch.chdir(tmp_path)
+        env_file = tmp_path / ".env"
+        env_file.write_text("# comment\nTEST_VAR=old\nTEST_VAR_2=keep\n")
+
+        integrator._set_env_variable("TEST_VAR", "a=b")
+        assert env_file.read_text() == "# comment\nTEST_VAR=a=b\nTEST_VAR_2=keep\n"
+
+        integrator._delete_env_variable("TEST_VAR")
+        assert env_file.read_text() == "# comment\nTEST_VAR_2=keep\n"
+    
+    @patch('subprocess.run')
+    def test_system_commands(self, mock_subprocess, integrator):
+        """Test system command execution"""
+        mock_subprocess.return_value = Mock(
+            returncode=0,
+            stdout="Command output",
+            stderr=""
+        )
+        
+        result = integrator._handle_system_commands({
+            'command': 'echo "Hello World"'
+        })
+        
+        assert result['success'] is True
+        assert result['stdout'] == "Command output"
+        mock_subprocess.assert_called_once()
+        assert mock_subprocess.call_args[0][0] == ['echo', 'Hello World']
+        assert mock_subprocess.call_args[1]['shell'] is False
+
+    @patch('subprocess.run')
+    def test_execute_ai_request_routes_git_operations(self, mock_subprocess, integrator):
+        """Test git requests are dispatched to the git handler"""
+        mock_subprocess.return_value = Mock(returncode=0, stdout="", stderr="")
+
+        with patch.object(integrator, '_log_execution'):
+            result = integrator.execute_ai_request(
+                'git_operations', {'operation': 'push', 'branch': 'main'})
+
+        assert result['success'] is True
+        mock_subprocess.assert_called_once()
+        assert mock_subprocess.call_args[0][0] == ['git', 'push', 'origin', '--', 'main']
+        assert mock_subprocess.call_args[1]['shell'] is False
+
+    @patch('subprocess.run')
+    def test_execute_batch_installs_in_one_call(self, mock_subprocess, integrator):
+        """Test batched package installs share a single pip invocation"""
+        mock_subprocess.return_value = Mock(returncode=0, stdout="ok", stderr="")
+        params_list = [{'operation': 'install', 'package': name}
+                       for name in ('requests', 'httpx')]
+
+        with patch.object(integrator, '_log_execution') as mock_log:
+            results = integrator.execute_batch('package_management', params_list)
+
+        mock_subprocess.assert_called_once()
+        assert mock_subprocess.call_args[0][0] == ['pip', 'install', '--', 'requests', 'httpx']
+        assert [result['message'] for result in results] == [
+            'تثبيت الحزمة: requests', 'تثبيت الحزمة: httpx']
+        assert mock_log.call_count == 2
+
+    @patch('subprocess.run')
+    def test_execute_batch_retries_failed_install_per_package(self, mock_subprocess, integrator):
+        """Test a failed pip batch falls back to one result per package"""
+        def run(command, **kwargs):
+            if 'missing-package' in command:
+                raise subprocess.CalledProcessError(
+                    1, command, stderr="No matching distribution")
+            return Mock(returncode=0, stdout="ok", stderr="")
+
+        mock_subprocess.side_effect = run
+        params_list = [{'operation': 'install', 'package': name}
+                       for name in ('httpx', 'missing-package')]
+
+        with patch.object(integrator, '_log_execution') as mock_log:
+            results = integrator.execute_batch('package_management', params_list)
+
+        assert mock_subprocess.call_count == 3
+        assert [result['success'] for result in results] == [True, False]
+        assert results[1]['error'] == "No matching distribution"
+        assert results[0] is not results[1]
+        assert mock_log.call_count == 2
+    
+    @pytest.mark.parametrize('request_type, params', [
+        ('git_operations', {'operation': 'push', 'branch': '--receive-pack=evil'}),
+        ('git_operations', {'operation': 'create_branch', 'branch': '-f'}),
+        ('package_management', {'operation': 'install', 'package': '--index-url=http://evil'}),
+        ('package_management', {'operation': 'install', 'package': '-r/etc/passwd'}),
+        ('package_management', {'operation': 'uninstall', 'package': 'http://evil/pkg.whl'}),
+    ])
+    @patch('subprocess.run')
+    def test_option_like_names_are_rejected(self, mock_subprocess, integrator,
+                                            request_type, params):
+        """Test model-supplied names cannot be parsed as git or pip options"""
+        with patch.object(integrator, '_log_execution'):
+            result = integrator.execute_ai_request(request_type, params)
+
+        assert result['success'] is False
+        mock_subprocess.assert_not_called()
+
+    @patch('subprocess.run')
+    def test_execute_batch_rejects_option_like_package(self, mock_subprocess, integrator):
+        """Test one invalid package in a batch fails alone without reaching pip"""
+        mock_subprocess.return_value = Mock(returncode=0, stdout="ok", stderr="")
+        params_list = [{'operation': 'install', 'package': name}
+                       for name in ('httpx', '--index-url=http://evil')]
+
+        with patch.object(integrator, '_log_execution'):
+            results = integrator.execute_batch('package_management', params_list)
+
+        assert [result['success'] for result in results] == [True, False]
+        mock_subprocess.assert_called_once()
+        assert mock_subprocess.call_args[0][0] == ['pip', 'install', '--', 'httpx']
+
+    def test_http_client_follows_redirects(self, integrator):
+        """Test API calls follow redirects like the requests-based client did"""
+        with integrator:
+            assert integrator._get_http_client().follow_redirects is True
+
+    def test_integration_logging(self, integrator):
+        """Test integration operation logging"""
+        initial_log_count = len(integrator.execution_log)
+        
+        integrator._log_execution(
+            "test_operation",
+            {"param": "value"},
+            {"success": True}
+        )
+        
+        assert len(integrator.execution_log) == initial_log_count + 1
+        assert integrator.execution_log[-1]['request_type'] == "test_operation"
+        assert integrator.execution_log[-1]['success'] is True
+        assert 'parameters' not in integrator.execution_log[-1]
@@ -0,0 +1,79 @@
+"""
+Test suite for the orchestration worker
+"""
+import asyncio
+import importlib
+import json
+import uuid
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+from worker.main import run_orchestration
+
+
+class TestRunOrchestration:
+    """Test cases for the run_orchestration job"""
+
+    @pytest.fixture
+    def conn(self):
+        """Mock database connection"""
+        return AsyncMock()
+
+    @pytest.fixture
+    def ctx(self, conn):
+        """Worker context around a mocked database pool"""
+        db_pool = MagicMock()
+        db_pool.acquire.return_value.__aenter__.return_value = conn
+        return {"config": Mock(), "redis": None, "openai_client": Mock(),
+                "http_client": Mock(), "db_pool": db_pool}
+
+    def run_job(self, ctx, results=None, side_effect=None):
+        """Run the job with the orchestrator returning results or raising"""
+        run_id = uuid.uuid4()
+        with patch('worker.main.EnhancedOrchestrator') as mock_orchestrator:
+            mock_orchestrator.return_value.process_topic_enhanced = AsyncMock(
+                return_value=results, side_effect=side_effect)
+            asyncio.run(run_orchestration(ctx, run_id, "Test topic", False))
+        return run_id
+
+    def test_missing_results_mark_run_failed(self, ctx, conn):
+        """Test a run whose templates failed to load is recorded as failed"""
+        run_id = self.run_job(ctx, results=None)
+
+        conn.execute.assert_awaited_once()
+        query, error_details, failed_id = conn.execute.await_args.args
+        assert "status = 'failed'" in query
+        assert "no results" in json.loads(error_details)["error"]
+        assert failed_id == run_id
+
+    def test_unexpected_error_marks_run_failed_and_reraises(self, ctx, conn):
+        """Test errors outside the handled ones still leave the run failed"""
+        with pytest.raises(KeyError):
+            self.run_job(ctx, side_effect=KeyError("phases"))
+
+        conn.execute.assert_awaited_once()
+        assert "status = 'failed'" in conn.execute.await_args.args[0]
+
+    def test_integrator_uses_shared_http_client(self, ctx):
+        """Test each job's integrator reuses the worker's HTTP client"""
+        with patch('worker.main.EnhancedOrchestrator') as mock_orchestrator:
+            mock_orchestrator.return_value.process_topic_enhanced = AsyncMock(return_value=None)
+            asyncio.run(run_orchestration(ctx, uuid.uuid4(), "Test topic", False))
+
+        assert mock_orchestrator.call_args.kwargs["http_client"] is ctx["http_client"]
+
+
+class TestWorkerModule:
+    """Test cases for the worker module setup"""
+
+    def test_imports_without_uvloop(self):
+        """Test the worker falls back to the default event loop without uvloop"""
+        import worker.main
+
+        try:
+            with patch.dict('sys.modules', {'uvloop': None}):
+                module = importlib.reload(worker.main)
+                assert module.uvloop is None
+        finally:
+            importlib.reload(worker.main)
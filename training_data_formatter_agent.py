@@ -1,7 +1,8 @@
 """
 This module defines the TrainingDataFormatterAgent class.
 """
-from data_creator_agent import Agent, ArchitectureEventType
+from data_creator_agent import (Agent, ArchitectureEventType,
+                                iter_analysis_payloads)
 
 
 class TrainingDataFormatterAgent(Agent):
@@ -32,19 +33,20 @@ class TrainingDataFormatterAgent(Agent):
             except Exception as e:
                 print(f"Error analyzing {msg.get('source_file')}: {e}")
         elif msg.get("type") == ArchitectureEventType.ANALYZED_DOCUMENTATION:
-            print(
-                f"{self.name}: Received analyzed documentation for '{msg.get('source_file')}'. "
-                "Formatting training data...")
+            for payload in iter_analysis_payloads(msg):
+                print(
+                    f"{self.name}: Received analyzed documentation for "
+                    f"'{payload.get('source_file')}'. Formatting training data...")
 
-            try:
-                for training_pair in self.format_doc_training_data(msg.get('analysis')):
-                    # Publish the structured analysis for this single file
-                    self.send({
-                        "type": ArchitectureEventType.TRAINING_PAIR_GENERATED,
-                        "training_pair": training_pair
-                    })
-            except Exception as e:
-                print(f"Error analyzing {msg.get('source_file')}: {e}")
+                try:
+                    for training_pair in self.format_doc_training_data(payload.get('analysis')):
+                        # Publish the structured analysis for this single file
+                        self.send({
+                            "type": ArchitectureEventType.TRAINING_PAIR_GENERATED,
+                            "training_pair": training_pair
+                        })
+                except Exception as e:
+                    print(f"Error analyzing {payload.get('source_file')}: {e}")
 
     def format_code_training_data(self, analysis):
         """Formats code analysis into training data."""
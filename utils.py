@@ -2,9 +2,12 @@
 وظائف مساعدة مشتركة
 """
 import os
+import atexit
 import json
 import logging
+import queue
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from typing import Dict, Any, Optional
 
 
@@ -45,6 +48,16 @@ def setup_logging(log_level: str = 'INFO', log_dir: str = 'logs') -> logging.Log
     return logger
 
 
+def queued_handler(*handlers: logging.Handler) -> QueueHandler:
+    """إرجاع معالج يضع السجلات في طابور تكتبها المعالجات المعطاة من خيط خلفي"""
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # تفريغ السجلات المتبقية عند إنهاء العملية
+    atexit.register(listener.stop)
+    return QueueHandler(log_queue)
+
+
 def save_results(data: Dict[Any, Any], filepath: str) -> bool:
     """حفظ النتائج في ملف JSON"""
     try:
@@ -0,0 +1,160 @@
+"""
+Orchestration worker
+Consumes orchestration jobs enqueued by the API from Redis (arq) and persists results
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+
+import asyncpg
+import orjson
+from arq import run_worker
+from arq.connections import RedisSettings
+from dotenv import load_dotenv
+
+from base_orchestrator import create_openai_client
+from config import Config
+from enhanced_orchestrator import EnhancedOrchestrator
+from system_integrator import create_http_client
+
+try:
+    import uvloop
+except ImportError:  # not installed on Windows (see requirements.txt)
+    uvloop = None
+
+load_dotenv()
+
+# Configure logging; importing enhanced_orchestrator already set up the root
+# logger, so its handlers are replaced here
+logging.basicConfig(level=logging.INFO, force=True)
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Orchestrations make several long model calls, well beyond arq's 300s default
+JOB_TIMEOUT_SECONDS = int(os.getenv("ORCHESTRATION_JOB_TIMEOUT", "1800"))
+MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "10"))
+
+PHASE_EXECUTION_COLUMNS = ['run_id', 'phase_code', 'phase_name',
+                           'status', 'response_text', 'completed_at']
+
+
+async def startup(ctx: dict):
+    """Open the resources shared by all jobs of this worker"""
+    ctx["config"] = Config()
+    ctx["openai_client"] = create_openai_client(ctx["config"])
+    # Shared by every job's integrator so API integration calls reuse connections
+    ctx["http_client"] = create_http_client()
+    ctx["db_pool"] = await asyncpg.create_pool(
+        DATABASE_URL,
+        min_size=1,
+        max_size=MAX_JOBS,
+        max_inactive_connection_lifetime=300
+    )
+    logger.info("Worker database pool established")
+
+
+async def shutdown(ctx: dict):
+    """Close the shared resources"""
+    await ctx["db_pool"].close()
+    await ctx["openai_client"].close()
+    ctx["http_client"].close()
+    logger.info("Worker connections closed")
+
+
+async def mark_run_failed(db_pool, run_id: uuid.UUID, error: Exception):
+    """Record a failed run with its error details"""
+    async with db_pool.acquire() as conn:
+        await conn.execute(
+            """UPDATE orchestration_runs
+               SET status = 'failed', error_details = $1, completed_at = NOW()
+               WHERE id = $2""",
+            orjson.dumps({"error": str(error)}).decode(), run_id
+        )
+
+
+async def run_orchestration(ctx: dict, run_id: uuid.UUID, topic: str, integration_enabled: bool):
+    """Run an orchestration and store its results"""
+    db_pool = ctx["db_pool"]
+    try:
+        # Orchestrators hold per-run state (integration log), so each job gets
+        # its own instance built around the worker's shared client and cache
+        orchestrator = EnhancedOrchestrator(
+            ctx["config"], cache=ctx["redis"], client=ctx["openai_client"],
+            http_client=ctx["http_client"])
+        results = await orchestrator.process_topic_enhanced(
+            topic, integration_enabled)
+        if results is None:
+            raise IOError("Orchestration produced no results (task template failed to load)")
+
+        completed_at = datetime.now(timezone.utc)
+        records = [
+            (run_id, phase_code, phase_data['phase'], phase_data['status'],
+             phase_data.get('response', ''), completed_at)
+            for phase_code, phase_data in results['phases'].items()
+        ]
+
+        # Update the run and save its phase executions atomically
+        async with db_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    """UPDATE orchestration_runs
+                       SET status = 'completed', results = $1, completed_at = $2,
+                           success_rate = $3, completed_phases = $4
+                       WHERE id = $5""",
+                    orjson.dumps(results, option=orjson.OPT_NAIVE_UTC).decode(),
+                    completed_at,
+                    float(results['metadata']['success_rate'].rstrip('%')),
+                    results['metadata']['successful_phases'],
+                    run_id
+                )
+
+                # Save phase executions in a single COPY round-trip; the
+                # savepoint keeps the outer transaction usable for the fallback
+                try:
+                    async with conn.transaction():
+                        await conn.copy_records_to_table(
+                            'phase_executions', records=records,
+                            columns=PHASE_EXECUTION_COLUMNS)
+                except asyncpg.FeatureNotSupportedError:
+                    await conn.executemany(
+                        """INSERT INTO phase_executions
+                           (run_id, phase_code, phase_name, status, response_text, completed_at)
+                           VALUES ($1, $2, $3, $4, $5, $6)""",
+                        records
+                    )
+
+    except (IOError, json.JSONDecodeError) as e:
+        logger.error("Orchestration failed for run %s: %s", run_id, e)
+        await mark_run_failed(db_pool, run_id, e)
+    except Exception as e:
+        # Never leave a run 'running': record the failure, then let arq see it
+        logger.exception("Unexpected error in orchestration run %s", run_id)
+        await mark_run_failed(db_pool, run_id, e)
+        raise
+
+
+class WorkerSettings:
+    """arq worker configuration"""
+    functions = [run_orchestration]
+    on_startup = startup
+    on_shutdown = shutdown
+    redis_settings = RedisSettings.from_dsn(REDIS_URL)
+    job_timeout = JOB_TIMEOUT_SECONDS
+    max_jobs = MAX_JOBS
+
+
+def main():
+    """Main function to run the worker."""
+    # libuv event loop: cheaper socket polling for the Redis, Postgres and OpenAI traffic
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    run_worker(WorkerSettings)
+
+
+if __name__ == "__main__":
+    main()